@@ -0,0 +1,389 @@
+"""In-process stand-in for TelegramClient, for measuring the engine without a Telegram account.
+
+FakeTelegramClient serves synthetic chats whose messages are generated on
+the fly from their ID, so a 1M message history costs no memory up front.
+It can add latency to every request, answer some sends with
+FloodWaitError and refuse forwards like a source with protected content,
+answers filtered and search queries like the shared media tabs, and it records request counts, per-send latency and, for
+a sample of messages, the latency from being read to being sent.
+"""
+import asyncio
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from telethon import errors, functions, types
+from forwarder_engine import ClientManager
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+# Message kinds each InputMessagesFilter returns; FakeChat has no GIFs, music or voice
+FILTER_KINDS = {
+    types.InputMessagesFilterPhotos: {'photo', 'album'},
+    types.InputMessagesFilterVideo: {'video'},
+    types.InputMessagesFilterPhotoVideo: {'photo', 'album', 'video'},
+    types.InputMessagesFilterDocument: {'document'},
+}
+
+DEFAULT_MIX = {'text': 0.4, 'photo': 0.25, 'video': 0.15, 'document': 0.1, 'album': 0.1}
+
+def spread(value, salt=0):
+    """Deterministic pseudo-random number in [0, 1) for an integer"""
+    value = (value * 2654435761 + salt * 40503) & 0xFFFFFFFF
+    value ^= value >> 16
+    value = (value * 0x45d9f3b) & 0xFFFFFFFF
+    value ^= value >> 16
+    return value / 0x100000000
+
+class FakePhoto:
+    __slots__ = ('id', 'sizes')
+
+    def __init__(self, photo_id, size):
+        self.id = photo_id
+        self.sizes = [types.PhotoSize(type='x', w=1280, h=720, size=size)]
+
+class FakeDocument:
+    __slots__ = ('id', 'size', 'mime_type', 'attributes')
+
+    def __init__(self, document_id, size, mime_type):
+        self.id = document_id
+        self.size = size
+        self.mime_type = mime_type
+        self.attributes = []
+
+class FakePhotoMedia:
+    __slots__ = ('photo',)
+
+    def __init__(self, photo):
+        self.photo = photo
+
+class FakeDocumentMedia:
+    __slots__ = ('document',)
+
+    def __init__(self, document):
+        self.document = document
+
+class FakeMessage:
+    __slots__ = ('id', 'chat_id', 'text', 'media', 'grouped_id', 'date', 'sender_id', 'views')
+
+    def __init__(self, chat_id, message_id, text, media, grouped_id):
+        self.id = message_id
+        self.chat_id = chat_id
+        self.text = text
+        self.media = media
+        self.grouped_id = grouped_id
+        self.date = EPOCH + timedelta(minutes=message_id)
+        self.sender_id = 1000 + message_id % 7
+        self.views = int(spread(message_id, 3) * 10000)
+
+    @property
+    def message(self):
+        return self.text
+
+class FakeChat:
+    """A synthetic chat of `size` messages with the given media mix"""
+
+    def __init__(self, chat_id, size, mix=None, duplicates=0.0, title=None):
+        self.id = chat_id
+        self.size = size
+        self.title = title or f"Chat {chat_id}"
+        self.duplicates = duplicates
+        total = sum((mix or DEFAULT_MIX).values())
+        self.mix = [(kind, share / total) for kind, share in (mix or DEFAULT_MIX).items()]
+        self.album_share = dict(self.mix).get('album', 0)
+        # Albums take whole slots of three IDs, the other kinds share the rest
+        others = [(kind, share) for kind, share in self.mix if kind != 'album']
+        others_total = sum(share for _, share in others) or 1
+        self.single_mix = [(kind, share / others_total) for kind, share in others]
+
+    def media_id(self, message_id):
+        if self.duplicates and spread(message_id, 5) < self.duplicates:
+            # Reposts of a small pool of files
+            return 1 + int(spread(message_id, 6) * 50)
+        return self.id * 10_000_000 + message_id
+
+    def kind(self, message_id):
+        slot = (message_id - 1) // 3
+        if spread(slot, 1) < self.album_share:
+            return 'album', slot + 1
+        point = spread(message_id, 2)
+        for kind, share in self.single_mix:
+            if point < share:
+                return kind, None
+            point -= share
+        return self.single_mix[-1][0], None
+
+    def message(self, message_id):
+        kind, grouped_id = self.kind(message_id)
+        text = f"Post {message_id} https://example.com/{message_id}" if message_id % 5 == 0 else f"Post {message_id}"
+        size = 50_000 + int(spread(message_id, 4) * 5_000_000)
+        if kind == 'text':
+            media = None
+        elif kind in ('photo', 'album'):
+            media = FakePhotoMedia(FakePhoto(self.media_id(message_id), size))
+            text = '' if kind == 'album' and message_id % 3 else text
+        elif kind == 'video':
+            media = FakeDocumentMedia(FakeDocument(self.media_id(message_id), size * 10, 'video/mp4'))
+        else:
+            media = FakeDocumentMedia(FakeDocument(self.media_id(message_id), size, 'application/pdf'))
+        return FakeMessage(self.id, message_id, text, media, grouped_id)
+
+class FakeDialog:
+    def __init__(self, chat_id, entity, unread_count, top_message, pinned=False):
+        self.id = chat_id
+        self.entity = entity
+        self.unread_count = unread_count
+        self.message = top_message
+        self.date = top_message.date
+        self.pinned = pinned
+
+class FakeTelegramClient:
+    """Implements the subset of TelegramClient the engine uses, against FakeChat objects
+
+    latency: seconds added to every request (history pages, sends, file parts, ...)
+    flood_every: every Nth send raises FloodWaitError(flood_seconds)
+    restricted: forwards raise ChatForwardsRestrictedError, so media has to be re-uploaded
+    """
+
+    page_size = 100
+    # One in every sample_every message IDs is timed from read to send
+    sample_every = 97
+
+    part_size = 512 * 1024
+
+    def __init__(self, chats=(), dialogs=0, latency=0.0, flood_every=0, flood_seconds=1, restricted=False):
+        self.chats = {chat.id: chat for chat in chats}
+        self.restricted = restricted
+        self.bytes_downloaded = 0
+        self.bytes_uploaded = 0
+        self.dialog_count = dialogs
+        self.latency = latency
+        self.flood_every = flood_every
+        self.flood_seconds = flood_seconds
+        self.connected = True
+        self.handlers = []
+        self.requests = 0
+        self.sends = 0
+        self.messages_sent = 0
+        self.send_latencies = []
+        self.read_times = {}
+        self.message_latencies = []
+        self.sent = []
+        self.keep_sent = False
+
+    async def request(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send(self, count, record, ids=()):
+        started = time.perf_counter()
+        self.sends += 1
+        if self.flood_every and self.sends % self.flood_every == 0:
+            await self.request()
+            raise errors.FloodWaitError(request=None, capture=self.flood_seconds)
+        await self.request()
+        self.messages_sent += count
+        if self.keep_sent:
+            self.sent.append(record)
+        finished = time.perf_counter()
+        self.send_latencies.append(finished - started)
+        for message_id in ids:
+            read = self.read_times.pop(message_id, None)
+            if read is not None:
+                self.message_latencies.append(finished - read)
+        return record
+
+    # Connection
+    def is_connected(self):
+        return self.connected
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def is_user_authorized(self):
+        return True
+
+    def add_event_handler(self, callback, event):
+        self.handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event):
+        self.handlers.remove((callback, event))
+
+    # Entities
+    async def get_entity(self, entity):
+        chat = self.chats.get(entity)
+        return types.Channel(id=abs(entity), title=chat.title if chat else str(entity),
+                             photo=types.ChatPhotoEmpty(), date=EPOCH)
+
+    async def get_input_entity(self, entity):
+        if isinstance(entity, int):
+            if entity < 0:
+                return types.InputPeerChannel(channel_id=abs(entity), access_hash=0)
+            return types.InputPeerUser(user_id=entity, access_hash=0)
+        if isinstance(entity, types.Channel):
+            return types.InputPeerChannel(channel_id=entity.id, access_hash=0)
+        return entity
+
+    # Reading
+    async def get_messages(self, entity, limit=None, **kwargs):
+        await self.request()
+        chat = self.chats[entity]
+        result = TotalList(chat.message(message_id) for message_id in range(chat.size, max(chat.size - (limit or 0), 0), -1))
+        result.total = chat.size
+        return result
+
+    def matches(self, chat, message_id, filter, search):
+        """Whether a filtered or search query returns the message; checked without a request"""
+        if filter is not None:
+            kinds = FILTER_KINDS.get(filter, set())
+            if filter is types.InputMessagesFilterUrl:
+                if 'https://' not in chat.message(message_id).text:
+                    return False
+            elif chat.kind(message_id)[0] not in kinds:
+                return False
+        if search is not None:
+            # Telegram matches every searched word as a word prefix
+            words = chat.message(message_id).text.lower().split()
+            return all(any(word.startswith(term) for word in words) for term in search.lower().split())
+        return True
+
+    async def iter_messages(self, entity, limit=None, *, reverse=False, min_id=0, max_id=0, offset_date=None,
+                            filter=None, search=None, **kwargs):
+        chat = self.chats[entity]
+        last = min(max_id - 1, chat.size) if max_id else chat.size
+        if reverse and offset_date is not None and not min_id:
+            min_id = max(min_id, int((offset_date - EPOCH).total_seconds() // 60) - 1)
+        ids = range(min_id + 1, last + 1) if reverse else range(last, min_id, -1)
+        if filter is not None or search is not None:
+            ids = (message_id for message_id in ids if self.matches(chat, message_id, filter, search))
+        await self.request()
+        for index, message_id in enumerate(ids):
+            if limit is not None and index >= limit:
+                break
+            if index and index % self.page_size == 0:
+                await self.request()
+            if message_id % self.sample_every == 0:
+                self.read_times[message_id] = time.perf_counter()
+            yield chat.message(message_id)
+
+    async def get_dialogs(self, limit=None):
+        return [dialog async for dialog in self.iter_dialogs(limit)]
+
+    async def iter_dialogs(self, limit=None, **kwargs):
+        count = self.dialog_count if limit is None else min(limit, self.dialog_count)
+        for index in range(count):
+            if index % self.page_size == 0:
+                await self.request()
+            yield self.dialog(index)
+
+    def dialog(self, index):
+        kind = index % 3
+        if kind == 0:
+            entity = types.User(id=index + 1, first_name=f"User {index}")
+            chat_id = index + 1
+        elif kind == 1:
+            entity = types.Chat(id=index + 1, title=f"Group {index}", photo=types.ChatPhotoEmpty(),
+                                participants_count=10, date=EPOCH, version=1)
+            chat_id = -(index + 1)
+        else:
+            entity = types.Channel(id=index + 1, title=f"Channel {index}", photo=types.ChatPhotoEmpty(), date=EPOCH)
+            chat_id = -1000000000000 - (index + 1)
+        top = FakeMessage(chat_id, 1000 - index % 1000, f"Last message {index}", None, None)
+        return FakeDialog(chat_id, entity, index % 4, top, pinned=index < 2)
+
+    # Sending
+    async def __call__(self, request):
+        """Raw requests: ForwardMessagesRequest and SaveBigFilePartRequest are supported"""
+        if isinstance(request, functions.upload.SaveBigFilePartRequest):
+            await self.request()
+            self.bytes_uploaded += len(request.bytes)
+            return True
+        return await self.forward_messages(request.to_peer, request.id)
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        ids = [getattr(message, 'id', message) for message in messages]
+        if self.restricted:
+            await self.request()
+            raise errors.ChatForwardsRestrictedError(request=None)
+        return await self.send(len(ids), ('forward', entity, ids), ids)
+
+    async def send_message(self, entity, message, **kwargs):
+        return await self.send(1, ('message', entity, message))
+
+    async def send_file(self, entity, file, caption=None, **kwargs):
+        count = len(file) if isinstance(file, list) else 1
+        return await self.send(count, ('file', entity, count))
+
+    # Files
+    def media_size(self, media):
+        document = getattr(media, 'document', None)
+        if document is not None:
+            return document.size
+        return max(size.size for size in media.photo.sizes)
+
+    async def download_media(self, media, file=None, **kwargs):
+        size = self.media_size(media)
+        for _ in range(math.ceil(size / self.part_size)):
+            await self.request()
+        with open(file, 'wb') as f:
+            # Sparse, the benchmark measures the engine rather than the disk
+            f.truncate(size)
+        self.bytes_downloaded += size
+        return file
+
+    async def iter_download(self, media, offset=0, limit=None, chunk_size=None, request_size=None,
+                            file_size=None, **kwargs):
+        size = file_size or self.media_size(media)
+        chunk_size = chunk_size or self.part_size
+        position = offset
+        while position < size and (limit is None or (position - offset) // chunk_size < limit):
+            await self.request()
+            chunk = bytes(min(chunk_size, size - position))
+            self.bytes_downloaded += len(chunk)
+            position += len(chunk)
+            yield chunk
+
+    async def upload_file(self, file, file_name=None, **kwargs):
+        size = os.path.getsize(file)
+        parts = max(1, math.ceil(size / self.part_size))
+        for _ in range(parts):
+            await self.request()
+        self.bytes_uploaded += size
+        return types.InputFile(id=self.requests, parts=parts, name=file_name or 'file', md5_checksum='')
+
+class TotalList(list):
+    total = 0
+
+class FakeClientManager:
+    """Stand-in for forwarder_engine.ClientManager that hands out a FakeTelegramClient
+
+    accounts maps the phones of extra send accounts to their own clients.
+    """
+
+    def __init__(self, client, accounts=None):
+        self.client = client
+        self.accounts = accounts or {}
+        self.spools = {}
+
+    # Jobs share spools as they do with the real manager
+    media_spool = ClientManager.media_spool
+
+    async def get_client(self, api_id, api_hash, phone):
+        return self.accounts.get(phone, self.client)
+
+    def submit(self, coro):
+        # Callers are already on the benchmark's loop
+        return asyncio.ensure_future(coro)
+
+    def run(self, coro):
+        return asyncio.run(coro)
+
+    def call_soon(self, callback, *args):
+        callback(*args)
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,253 @@
+"""Offline benchmarks for the forwarding engine, run against FakeTelegramClient
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --scenarios history --latency 0.005
+    python benchmarks/run_benchmarks.py --json results.json
+
+Every scenario runs in its own process so its peak RSS is measured on
+its own. Results report throughput, p50/p99 latency, peak RSS and
+requests per message.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_client import FakeChat, FakeClientManager, FakeTelegramClient
+from forwarder_engine import ChatLoader, ForwardingJob, JobScheduler, RateLimiter, ignore
+from forwarder_trace import Tracer
+
+SCENARIOS = ('history', 'chats', 'filter', 'resend', 'jobs')
+# 'resend' moves real (sparse) files through the spool and 'jobs' is paced by
+# --job-rate, so they only run when asked for
+DEFAULT_SCENARIOS = ('history', 'chats', 'filter')
+SOURCE_ID = -1001
+DEST_ID = -1002
+ALL_FILTERS = {'text': True, 'media': True, 'documents': True}
+
+def log(text):
+    print(text, file=sys.stderr)
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def make_job(client, size, args, filters=ALL_FILTERS, accounts=None, source_id=SOURCE_ID, priority=None):
+    client.chats[source_id] = FakeChat(source_id, size, duplicates=args.duplicates)
+    accounts = accounts or {}
+    for account in accounts.values():
+        account.chats = client.chats
+    job = ForwardingJob(
+        FakeClientManager(client, accounts), 0, '', 'benchmark', source_id,
+        [DEST_ID - index for index in range(args.destinations)], filters,
+        forward_existing=True, copy_mode='copy', live=False, dedup=args.dedup, priority=priority,
+        send_accounts=[{'api_id': 0, 'api_hash': '', 'phone': phone} for phone in accounts],
+        transfer_workers=args.workers, preserve_order=not args.unordered, on_message=log if args.verbose else ignore, on_error=log
+    )
+    job.is_running = True
+    job.client = client
+    if args.trace:
+        job.trace_file = os.path.join(args.trace, f'trace_{args.worker}_{args.size}.json')
+        job.tracer = Tracer(f'{args.worker} {args.size}')
+    return job
+
+async def bench_history(size, args, restricted=False):
+    """Copy a whole history through ForwardingJob: read, batch, forward, checkpoint"""
+    def make_client():
+        return FakeTelegramClient(latency=args.latency, flood_every=args.flood_every,
+                                  flood_seconds=args.flood_seconds, restricted=restricted)
+
+    client = make_client()
+    # Extra send accounts, each with its own flood limit
+    accounts = {f'+{index}': make_client() for index in range(1, args.accounts)}
+    job = make_job(client, size, args, accounts=accounts)
+    for route in job.routes:
+        # The real limiter caps sends at a few per second and slows down on flood waits; measure the engine instead
+        route.rate_limiter = RateLimiter(rate=1e9, burst=1e9, min_rate=1e9, max_rate=1e9)
+    started = time.perf_counter()
+    await job.forward_messages()
+    elapsed = time.perf_counter() - started
+    report_trace(job)
+    clients = [client] + list(accounts.values())
+    return {
+        'messages': sum(each.messages_sent for each in clients),
+        'elapsed': elapsed,
+        'latencies': [latency for each in clients for latency in each.message_latencies or each.send_latencies],
+        'requests': sum(each.requests for each in clients),
+        'bytes_downloaded': client.bytes_downloaded,
+        'bytes_uploaded': client.bytes_uploaded,
+    }
+
+async def bench_resend(size, args):
+    """Copy a history from a source that doesn't allow forwarding: download and re-upload media"""
+    return await bench_history(size, args, restricted=True)
+
+async def bench_jobs(size, args):
+    """A bulk history copy and a high priority copy a tenth its size, run together by JobScheduler
+
+    Both share one account's budget of --job-rate sends per second. The
+    result adds how long each job took to finish.
+    """
+    client = FakeTelegramClient(latency=args.latency, flood_every=args.flood_every, flood_seconds=args.flood_seconds)
+    manager = FakeClientManager(client)
+    scheduler = JobScheduler(manager, rate=args.job_rate, burst=1)
+    jobs = {
+        'bulk': make_job(client, size, args),
+        'high': make_job(client, max(1, size // 10), args, source_id=SOURCE_ID - 100, priority='high'),
+    }
+    finished = {}
+    started = time.perf_counter()
+    for name, job in jobs.items():
+        job.client_manager = manager
+        for route in job.routes:
+            # Only the scheduler's shared budget limits the sends
+            route.rate_limiter = RateLimiter(rate=1e9, burst=1e9, min_rate=1e9, max_rate=1e9)
+        future = scheduler.futures[scheduler.submit(job)]
+        future.add_done_callback(lambda future, name=name: finished.setdefault(name, time.perf_counter() - started))
+    await asyncio.gather(*scheduler.futures.values())
+    return {
+        'messages': client.messages_sent,
+        'elapsed': time.perf_counter() - started,
+        'latencies': client.send_latencies,
+        'requests': client.requests,
+        'high_seconds': finished['high'],
+        'bulk_seconds': finished['bulk'],
+    }
+
+async def bench_chats(size, args):
+    """Load and classify a dialog list of `size` chats"""
+    client = FakeTelegramClient(dialogs=size, latency=args.latency)
+    loaded = []
+    loader = ChatLoader(FakeClientManager(client), 0, '', 'benchmark', on_chats=loaded.extend)
+    loader.client = client
+    started = time.perf_counter()
+    await loader.load_chat_list()
+    elapsed = time.perf_counter() - started
+    return {'messages': len(loaded), 'elapsed': elapsed, 'latencies': [], 'requests': client.requests}
+
+async def bench_filter(size, args):
+    """Read a history through the query plan, filter and group albums, without sending"""
+    client = FakeTelegramClient(latency=args.latency)
+    job = make_job(client, size, args, filters={'text': False, 'media': True, 'documents': False})
+    latencies = []
+    started = time.perf_counter()
+    last = started
+    async for unit in job.iter_history():
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+    elapsed = time.perf_counter() - started
+    report_trace(job)
+    # Rate and requests are per message of the source history, however few the server returned
+    return {'messages': size, 'scanned': job.messages_scanned, 'elapsed': elapsed, 'latencies': latencies,
+            'requests': client.requests}
+
+def report_trace(job):
+    if job.tracer.enabled:
+        for line in job.tracer.format_summary():
+            log(line)
+        job.tracer.export(job.trace_file)
+
+def run_scenario(args):
+    """Worker process: run one scenario at one size and print its result as JSON"""
+    bench = {'history': bench_history, 'chats': bench_chats, 'filter': bench_filter,
+             'resend': bench_resend, 'jobs': bench_jobs}[args.worker]
+    with tempfile.TemporaryDirectory() as workdir:
+        # Checkpoint and dedup databases are created in the working directory
+        os.chdir(workdir)
+        result = asyncio.run(bench(args.size, args))
+    latencies = result.pop('latencies')
+    messages = result['messages']
+    result.update({
+        'scenario': args.worker,
+        'size': args.size,
+        'rate': messages / max(result['elapsed'], 1e-9),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'requests_per_message': result['requests'] / messages if messages else 0.0,
+    })
+    print(json.dumps(result))
+
+def spawn(scenario, size, args):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', scenario, '--size', str(size),
+               '--latency', str(args.latency), '--flood-every', str(args.flood_every),
+               '--flood-seconds', str(args.flood_seconds), '--duplicates', str(args.duplicates),
+               '--workers', str(args.workers), '--destinations', str(args.destinations),
+               '--accounts', str(args.accounts), '--job-rate', str(args.job_rate)]
+    if args.unordered:
+        command.append('--unordered')
+    if not args.dedup:
+        command.append('--no-dedup')
+    if args.verbose:
+        command.append('--verbose')
+    if args.trace:
+        command.extend(['--trace', os.path.abspath(args.trace)])
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def print_table(results):
+    header = f"{'scenario':<9} {'size':>9} {'items/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'peak RSS':>10} {'req/msg':>8}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(
+            f"{result['scenario']:<9} {result['size']:>9} {result['rate']:>11.0f} "
+            f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['peak_rss_mb']:>8.1f}MB "
+            f"{result['requests_per_message']:>8.3f}"
+        )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the forwarding engine")
+    parser.add_argument('--sizes', default='1000,100000,1000000', help="Comma separated message/chat counts")
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS), help="Comma separated: " + ', '.join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every fake request")
+    parser.add_argument('--flood-every', type=int, default=0, help="Answer every Nth send with a flood wait")
+    parser.add_argument('--flood-seconds', type=float, default=0.0, help="Length of those flood waits")
+    parser.add_argument('--accounts', type=int, default=1, help="Send accounts per job for 'history'/'resend'")
+    parser.add_argument('--job-rate', type=float, default=50.0, help="Shared sends per second for 'jobs'")
+    parser.add_argument('--duplicates', type=float, default=0.0, help="Share of media reposted from a small pool")
+    parser.add_argument('--destinations', type=int, default=1, help="Destinations per job for 'history'/'resend'")
+    parser.add_argument('--workers', type=int, default=4, help="Media transfer workers for 'resend'")
+    parser.add_argument('--unordered', action='store_true', help="Send re-uploaded media as soon as it is ready")
+    parser.add_argument('--no-dedup', dest='dedup', action='store_false', help="Disable the dedup index")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the engine's log output")
+    parser.add_argument('--trace', help="Write a Chrome trace of each 'history'/'resend'/'filter' run to this directory")
+    parser.add_argument('--worker', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_scenario(args)
+        return 0
+
+    results = []
+    for scenario in args.scenarios.split(','):
+        for size in (int(size) for size in args.sizes.split(',')):
+            results.append(spawn(scenario.strip(), size, args))
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
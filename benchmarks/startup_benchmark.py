@@ -0,0 +1,125 @@
+"""Startup time of the GUI: time to first paint and time to interactive
+
+Usage:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 20 --json startup.json
+    python benchmarks/startup_benchmark.py --root ../old-checkout   # compare another tree
+
+Every run starts a fresh interpreter in an empty directory, so there are no
+saved credentials and nothing goes to the network. Times are measured from
+the moment the process is started: first paint is the main window's first
+paint event, interactive is when the client loop is up and saved
+credentials would be used (ready_signal, or the first paint in trees that
+set everything up before showing the window). Without a display the
+offscreen Qt platform is used.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Give up on a run that never becomes interactive
+RUN_TIMEOUT = 30
+
+def log(text):
+    print(text, file=sys.stderr)
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+def run_worker(args):
+    started = args.started
+    sys.path.insert(0, args.root)
+    import telegram_forwarder_ui_v2 as ui
+    from PyQt5.QtCore import QEvent, QObject, QTimer
+    imported = time.time() - started
+
+    result = {'import_ms': imported * 1000}
+
+    if hasattr(ui, 'create_app'):
+        app = ui.create_app(sys.argv[:1])
+    else:
+        app = ui.QApplication(sys.argv[:1])
+
+    def finish():
+        print(json.dumps(result))
+        app.quit()
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and 'first_paint_ms' not in result:
+                result['first_paint_ms'] = (time.time() - started) * 1000
+                if not hasattr(window, 'ready_signal'):
+                    result['interactive_ms'] = result['first_paint_ms']
+                    QTimer.singleShot(0, finish)
+            return False
+
+    first_paint = FirstPaint()
+    # The window paints as soon as it is shown from its __init__, so watch every object
+    app.installEventFilter(first_paint)
+    window = ui.TelegramForwarderUI()
+
+    def ready():
+        result['interactive_ms'] = (time.time() - started) * 1000
+        QTimer.singleShot(0, finish)
+
+    if hasattr(window, 'ready_signal'):
+        if window.client_manager is not None and window.started:
+            ready()
+        else:
+            window.ready_signal.connect(ready)
+    QTimer.singleShot(RUN_TIMEOUT * 1000, app.quit)
+    app.exec_()
+    window.close()
+
+def spawn(args):
+    env = dict(os.environ)
+    if not env.get('DISPLAY') and sys.platform.startswith('linux'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    with tempfile.TemporaryDirectory() as workdir:
+        command = [sys.executable, os.path.abspath(__file__), '--worker', '--root', os.path.abspath(args.root),
+                   '--started', repr(time.time())]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True, cwd=workdir, env=env,
+                                timeout=RUN_TIMEOUT + 10).stdout
+    lines = output.strip().splitlines()
+    if not lines:
+        raise RuntimeError("The window never finished starting")
+    return json.loads(lines[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup time of the GUI")
+    parser.add_argument('--runs', type=int, default=10, help="Fresh processes to start")
+    parser.add_argument('--root', default=ROOT, help="Tree containing telegram_forwarder_ui_v2.py")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--started', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    runs = []
+    for index in range(args.runs):
+        runs.append(spawn(args))
+        log(f"run {index + 1}/{args.runs}: first paint {runs[-1]['first_paint_ms']:.0f} ms, "
+            f"interactive {runs[-1]['interactive_ms']:.0f} ms")
+
+    results = {key: median([run[key] for run in runs]) for key in ('import_ms', 'first_paint_ms', 'interactive_ms')}
+    print(f"{'median of':<16} {args.runs:>6} runs")
+    print(f"{'import':<16} {results['import_ms']:>6.0f} ms")
+    print(f"{'first paint':<16} {results['first_paint_ms']:>6.0f} ms")
+    print(f"{'interactive':<16} {results['interactive_ms']:>6.0f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': runs, 'median': results}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Headless entry point: log in, list chats and run forwarding routes without PyQt5.
+
+Routes are read from a JSON config file, for example:
+
+    {
+        "routes": [
+            {
+                "name": "backup",
+                "source": -1001234567890,
+                "destinations": [-1009876543210],
+                "filters": {"types": ["photo", "video"], "exclude_keywords": ["#ad"]},
+                "history": true,
+                "incremental": true,
+                "live": true,
+                "copy_mode": "copy",
+                "dedup": true,
+                "transfer_workers": 4,
+                "preserve_order": true
+            }
+        ]
+    }
+
+"filters" takes the rules described in forwarder_filters.py; "filters_file"
+may point to a JSON file with more rules. "min_id"/"max_id" limit the
+history copy to the message IDs between them and the "after"/"before"
+rules to a date range; "incremental" copies only messages newer than the
+last finished run, so a nightly run reads just the delta. api_id,
+api_hash and phone may be set in the config too; otherwise the
+credentials.json saved by the GUI is used.
+
+Extra send accounts ("accounts": [{"api_id", "api_hash", "phone"}] in the
+config, or accounts.json as saved by the GUI) share the sending of every
+route; log each one in once with `login --account PHONE`.
+
+Routes run concurrently and share the account's send budget: live routes
+get a larger share than history copies, "priority": "high" or "bulk" on a
+route overrides that.
+
+"trace_file" records how long each stage of a route (fetching pages,
+filters, rate and flood waits, downloads, uploads, sends) takes, logs a
+summary when it ends and writes a Chrome trace to that path.
+
+With "metrics_port" in the config (or --metrics-port) the routes' counters
+are served in the Prometheus text format on http://127.0.0.1:PORT/metrics.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from forwarder_engine import ChatLoader, ClientManager, ForwardingJob, JobScheduler, format_metrics, load_accounts
+from forwarder_filters import load_rules
+from forwarder_metrics import MetricsServer
+
+DEFAULT_FILTERS = {'text': True, 'media': True, 'documents': False}
+# Seconds between the 📊 status lines of a running route
+METRICS_INTERVAL = 30
+
+def load_config(path):
+    config = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    # Fall back to the credentials saved by the GUI
+    if os.path.exists('credentials.json'):
+        with open('credentials.json', 'r') as f:
+            for key, value in json.load(f).items():
+                config.setdefault(key, value)
+
+    missing = [key for key in ('api_id', 'api_hash', 'phone') if not config.get(key)]
+    if missing:
+        raise SystemExit(f"Missing {', '.join(missing)} in {path} and credentials.json")
+    config['api_id'] = int(config['api_id'])
+    if 'accounts' not in config:
+        config['accounts'] = load_accounts()
+    return config
+
+def account_config(config, phone):
+    """config with an extra account's credentials in place of the main ones"""
+    for account in config['accounts']:
+        if account.get('phone') == phone:
+            return {**config, 'api_id': int(account['api_id']), 'api_hash': account['api_hash'], 'phone': phone}
+    raise SystemExit(f"No account {phone} in the config or accounts.json")
+
+def sign_in(manager, config, load_chats=False):
+    """Run a ChatLoader, asking for the verification code on the terminal if needed"""
+    result = {'chats': [], 'ok': True}
+    code_requested = threading.Event()
+
+    def on_error(error):
+        result['ok'] = False
+        logging.error(error)
+
+    loader = ChatLoader(
+        manager, config['api_id'], config['api_hash'], config['phone'], load_chats=load_chats,
+        on_chats=lambda chats: result.update(chats=chats),
+        on_error=on_error,
+        on_code_request=code_requested.set,
+        on_status=logging.info
+    )
+    future = manager.submit(loader.get_chats())
+    # The loader waits on the client loop, the prompt has to run on this thread
+    while not future.done():
+        if code_requested.wait(0.2):
+            code_requested.clear()
+            loader.set_verification_code(input("Verification code: ").strip() or None)
+    future.result()
+    return result
+
+def build_jobs(manager, config):
+    jobs = []
+    for index, route in enumerate(config.get('routes', []), 1):
+        name = route.get('name', f'route{index}')
+        log = logging.getLogger(name)
+        filters = dict(route.get('filters', DEFAULT_FILTERS))
+        if route.get('filters_file'):
+            filters.update(load_rules(route['filters_file']))
+        try:
+            jobs.append(ForwardingJob(
+                manager,
+                config['api_id'],
+                config['api_hash'],
+                config['phone'],
+                route['source'],
+                route['destinations'],
+                filters,
+                forward_existing=route.get('history', True),
+                copy_mode=route.get('copy_mode', 'copy'),
+                live=route.get('live', False),
+                dedup=route.get('dedup', True),
+                min_id=route.get('min_id', 0),
+                max_id=route.get('max_id', 0),
+                incremental=route.get('incremental', False),
+                send_accounts=config['accounts'],
+                priority=route.get('priority'),
+                transfer_workers=route.get('transfer_workers', 4),
+                preserve_order=route.get('preserve_order', True),
+                spool_limit=route.get('spool_limit_mb', 1024) * 1024 * 1024,
+                trace_file=route.get('trace_file'),
+                on_message=log.info,
+                on_error=log.error,
+                on_metrics=lambda snapshot, log=log: log.info(f"📊 {format_metrics(snapshot)}"),
+                metrics_interval=METRICS_INTERVAL
+            ))
+        except ValueError as e:
+            raise SystemExit(f"Invalid route {name}: {str(e)}")
+    return jobs
+
+def cmd_login(manager, config, account=None):
+    if account:
+        config = account_config(config, account)
+    return 0 if sign_in(manager, config)['ok'] else 1
+
+def cmd_chats(manager, config):
+    result = sign_in(manager, config, load_chats=True)
+    for chat in result['chats']:
+        print(f"{chat['id']:>16}  {chat['type']:<8} {chat['title']}")
+    return 0 if result['ok'] else 1
+
+def cmd_run(manager, config):
+    jobs = build_jobs(manager, config)
+    if not jobs:
+        raise SystemExit("No routes configured")
+
+    scheduler = JobScheduler(manager)
+    metrics_server = None
+    if config.get('metrics_port'):
+        metrics_server = MetricsServer(port=int(config['metrics_port']))
+        metrics_server.add_scheduler(scheduler)
+        try:
+            metrics_server.start()
+        except OSError as e:
+            raise SystemExit(f"Can't serve metrics on port {config['metrics_port']}: {str(e)}")
+        logging.info(f"📈 Metrics on http://{metrics_server.host}:{metrics_server.port}/metrics")
+
+    for job in jobs:
+        scheduler.submit(job)
+    try:
+        for future in list(scheduler.futures.values()):
+            future.result()
+    except KeyboardInterrupt:
+        logging.info("Stopping, waiting for in-flight requests...")
+        scheduler.stop_all(timeout=None)
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Telegram Media Forwarder without the GUI')
+    parser.add_argument('command', choices=['login', 'chats', 'run'])
+    parser.add_argument('--config', default='forwarder.json', help='routes/credentials file (default: forwarder.json)')
+    parser.add_argument('--account', help='with login: sign in this extra send account instead')
+    parser.add_argument('--metrics-port', type=int, help='with run: serve Prometheus metrics on this local port')
+    parser.add_argument('--verbose', action='store_true', help='include Telethon debug logs')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    logging.getLogger('telethon').setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
+    config = load_config(args.config)
+    if args.metrics_port:
+        config['metrics_port'] = args.metrics_port
+    manager = ClientManager()
+    try:
+        if args.command == 'login':
+            return cmd_login(manager, config, args.account)
+        return {'chats': cmd_chats, 'run': cmd_run}[args.command](manager, config)
+    finally:
+        manager.shutdown()
+
+if __name__ == '__main__':
+    sys.exit(main())
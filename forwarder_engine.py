@@ -0,0 +1,2025 @@
+"""Forwarding engine: Telegram client, chat listing and copy jobs, without any Qt dependency.
+
+Used by the PyQt5 GUI (telegram_forwarder_ui_v2.py) and by the headless
+CLI (forwarder_cli.py).
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import mimetypes
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from telethon import TelegramClient
+from telethon import errors, events, functions, helpers, types
+from forwarder_filters import MessageFilter, QueryPlan
+from forwarder_metrics import Histogram
+from forwarder_trace import NULL_TRACER, Tracer
+
+def ignore(*args):
+    """Default for callbacks nobody listens to"""
+
+class ClientManager:
+    """Owns the long-lived TelegramClients, one per account, running on a dedicated asyncio loop thread
+
+    Chat loading, login and forwarding jobs are submitted to the loop as
+    coroutines, so each account connects once and every job shares the
+    same connection and session file.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop, name='telegram-client', daemon=True)
+        self.thread.start()
+        # Keyed by phone
+        self.clients = {}
+        self.credentials = {}
+        self.lock = None
+        # MediaSpools by directory, shared by the jobs
+        self.spools = {}
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Run a coroutine on the client loop and wait for its result"""
+        return self.submit(coro).result()
+
+    def call_soon(self, callback, *args):
+        """Run a plain callback on the client loop, e.g. to set an asyncio.Event"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    async def get_client(self, api_id, api_hash, phone):
+        """Return the account's connected client, creating or reconnecting it when needed"""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            client = self.clients.get(phone)
+            if client and self.credentials[phone] != (api_id, api_hash):
+                await client.disconnect()
+                client = None
+
+            if client is None:
+                client = TelegramClient(
+                    f'session_{phone}',
+                    api_id,
+                    api_hash,
+                    device_model="Desktop",
+                    system_version="Windows",
+                    app_version="1.0",
+                    retry_delay=1
+                )
+                self.clients[phone] = client
+                self.credentials[phone] = (api_id, api_hash)
+
+            if not client.is_connected():
+                await client.connect()
+            return client
+
+    def media_spool(self, directory='media_spool', max_bytes=1 << 30):
+        """The MediaSpool of a directory, one for every job on the loop so its limit holds for all of them
+
+        When jobs ask for different limits the smallest applies.
+        """
+        key = os.path.abspath(directory)
+        spool = self.spools.get(key)
+        if spool is None:
+            spool = self.spools[key] = MediaSpool(directory, max_bytes)
+        else:
+            spool.max_bytes = min(spool.max_bytes, max_bytes)
+        return spool
+
+    async def disconnect(self, phone=None):
+        """Disconnect one account, or every account without a phone"""
+        for phone in [phone] if phone else list(self.clients):
+            client = self.clients.pop(phone, None)
+            self.credentials.pop(phone, None)
+            if client:
+                await client.disconnect()
+
+    def shutdown(self):
+        """Disconnect and stop the loop thread"""
+        try:
+            self.submit(self.disconnect()).result(timeout=10)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+class ChatCache:
+    """The last loaded chat list of an account, kept on disk next to its session file"""
+
+    def __init__(self, phone):
+        self.path = self.path_for(phone)
+
+    @staticmethod
+    def path_for(phone):
+        return f'chats_{phone}.json'
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('chats', [])
+        except (OSError, ValueError):
+            return []
+
+    def save(self, chats):
+        # Write then rename, so an interrupted save never leaves a broken cache
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'chats': chats}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class ChatLoader:
+    """Signs in (asking for a verification code if needed) and lists the account's chats"""
+
+    def __init__(self, client_manager, api_id, api_hash, phone, load_chats=False,
+                 on_chats=None, on_error=None, on_code_request=None, on_login_success=None,
+                 on_status=None, on_progress=None, on_chat_page=None):
+        self.on_chats = on_chats or ignore
+        # Receives the chats page by page while a list is loaded without a cache
+        self.on_chat_page = on_chat_page or ignore
+        self.on_error = on_error or ignore
+        self.on_code_request = on_code_request or ignore
+        self.on_login_success = on_login_success or ignore
+        self.on_status = on_status or ignore
+        self.on_progress = on_progress or ignore
+        self.client_manager = client_manager
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.phone = phone
+        self.client = None
+        self.code = None
+        self.code_ready = None
+        self.verification_timeout = 60
+        self.load_chats = load_chats
+        self.page_size = 100
+
+    def set_verification_code(self, code):
+        """Set the verification code and signal that it's ready"""
+        self.code = code
+        # The event belongs to the client loop, so it is set from there
+        if self.code_ready:
+            self.client_manager.call_soon(self.code_ready.set)
+
+    async def initialize_client(self):
+        """Get the shared client, connecting only if it isn't already"""
+        self.client = await self.client_manager.get_client(self.api_id, self.api_hash, self.phone)
+        return await self.client.is_user_authorized()
+
+    async def get_chats(self):
+        try:
+            # Initialize client
+            self.on_status("Connecting to Telegram...")
+            self.on_progress("Step 1/3: Initializing connection...")
+            
+            is_authorized = await self.initialize_client()
+            
+            if not is_authorized:
+                self.on_status("Requesting verification code...")
+                self.on_progress("Step 2/3: Verification...")
+                
+                self.code_ready = asyncio.Event()
+                await self.client.send_code_request(self.phone)
+                self.on_code_request()
+                
+                try:
+                    await asyncio.wait_for(self.code_ready.wait(), timeout=self.verification_timeout)
+                except asyncio.TimeoutError:
+                    raise Exception("Verification timeout")
+                
+                if not self.code:
+                    raise Exception("Verification cancelled")
+                
+                try:
+                    self.on_status("Signing in...")
+                    self.on_progress("Step 3/3: Authentication...")
+                    await self.client.sign_in(self.phone, self.code)
+                    self.on_login_success()
+                except Exception as e:
+                    raise Exception(f"Login failed: {str(e)}")
+            else:
+                self.on_status("Already authorized!")
+                self.on_login_success()
+
+            # Only load chats if specifically requested
+            if self.load_chats:
+                await self.load_chat_list()
+
+        except Exception as e:
+            self.on_error(str(e))
+
+    def chat_info(self, dialog):
+        chat_type = "Unknown"
+        chat_title = getattr(dialog.entity, 'title', None) or getattr(dialog.entity, 'first_name', 'Unknown')
+
+        if isinstance(dialog.entity, types.User):
+            chat_type = "Private"
+        elif isinstance(dialog.entity, (types.Chat, types.ChatForbidden)):
+            chat_type = "Group"
+        elif isinstance(dialog.entity, types.Channel):
+            chat_type = "Channel"
+
+        return {
+            'id': dialog.id,
+            'title': chat_title,
+            'type': chat_type,
+            'unread_count': dialog.unread_count,
+            # Markers to tell whether the chat changed since it was cached
+            'top_message': dialog.message.id if dialog.message else 0,
+            'date': int(dialog.date.timestamp()) if dialog.date else 0
+        }
+
+    async def load_chat_list(self):
+        """Show the cached chat list at once, then fetch only the dialogs that changed
+
+        Dialogs arrive newest first, so the first non-pinned one whose top
+        message matches the cache means everything after it is unchanged.
+        Without a cache the list is streamed to on_chat_page as it arrives.
+        Chats left since the cache was saved stay listed until it is cleared.
+        """
+        try:
+            self.on_status("Loading chats...")
+            self.on_progress("Loading chat list...")
+
+            cache = ChatCache(self.phone)
+            cached = cache.load()
+            if cached:
+                self.on_chats(cached)
+                self.on_progress(f"Showing {len(cached)} cached chats, checking for changes...")
+            known = {chat['id']: chat for chat in cached}
+
+            fetched = []
+            page = []
+            async for dialog in self.client.iter_dialogs():
+                chat = self.chat_info(dialog)
+                previous = known.get(chat['id'])
+                if (previous and not dialog.pinned and previous.get('top_message') == chat['top_message']
+                        and previous.get('date') == chat['date']):
+                    break
+                fetched.append(chat)
+                if not cached:
+                    page.append(chat)
+                    if len(page) >= self.page_size:
+                        self.on_chat_page(page)
+                        page = []
+            if page:
+                self.on_chat_page(page)
+
+            refreshed = {chat['id'] for chat in fetched}
+            chat_list = fetched + [chat for chat in cached if chat['id'] not in refreshed]
+            cache.save(chat_list)
+
+            self.on_chats(chat_list)
+            if cached:
+                changed = sum(1 for chat in fetched if known.get(chat['id']) != chat)
+                self.on_progress(f"{changed} chats changed since the last load")
+            self.on_status("Chats loaded successfully!")
+            
+        except Exception as e:
+            self.on_error(f"Error loading chats: {str(e)}")
+
+class RateLimiter:
+    """Token bucket shared by every send path, slowed down by FloodWaitError"""
+
+    def __init__(self, rate=3.0, burst=5, min_rate=0.2, max_rate=10.0, ramp_step=0.05):
+        self.initial_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ramp_step = ramp_step
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # Created on first use so it belongs to the loop of the sending thread
+        self.lock = None
+        self.throttle_wait = 0.0
+        self.flood_wait = 0.0
+        self.flood_waits = 0
+
+    @property
+    def total_wait(self):
+        return self.throttle_wait + self.flood_wait
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+                self.throttle_wait += delay
+                await asyncio.sleep(delay)
+
+    def fresh(self):
+        """A new limiter with the same settings"""
+        return RateLimiter(self.initial_rate, self.burst, self.min_rate, self.max_rate, self.ramp_step)
+
+    def available(self):
+        """Tokens that could be spent right now"""
+        return min(self.burst, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+    def slow_down(self, seconds):
+        """Count a flood wait of seconds and halve the rate, without waiting it out"""
+        self.flood_waits += 1
+        self.flood_wait += seconds
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.updated = time.monotonic() + seconds
+
+    def success(self):
+        """Ramp the rate back up after a request went through"""
+        self.rate = min(self.max_rate, self.rate + self.ramp_step)
+
+    def metrics(self):
+        return {
+            'rate': self.rate,
+            'flood_waits': self.flood_waits,
+            'flood_wait_seconds': self.flood_wait,
+            'total_wait_seconds': self.total_wait
+        }
+
+ACCOUNTS_FILE = 'accounts.json'
+# The account itself can't send there (not a member, banned, limited), another one may
+ACCOUNT_ERRORS = (
+    errors.ChatWriteForbiddenError, errors.ChannelPrivateError, errors.UserBannedInChannelError,
+    errors.ChatAdminRequiredError, errors.PeerFloodError
+)
+# The session is gone, the account stays out until it logs in again
+AUTH_ERRORS = (
+    errors.AuthKeyUnregisteredError, errors.AuthKeyDuplicatedError, errors.SessionRevokedError,
+    errors.SessionExpiredError, errors.UserDeactivatedError, errors.UserDeactivatedBanError
+)
+# Send errors about the messages themselves: the batch is skipped and the copy goes on
+MESSAGE_ERRORS = (
+    errors.MessageIdInvalidError, errors.MessageIdsEmptyError, errors.MessageEmptyError, errors.MessageTooLongError,
+    errors.MediaEmptyError, errors.MediaInvalidError, errors.MediaCaptionTooLongError,
+    errors.FileReferenceExpiredError, errors.FilePartsInvalidError, errors.GroupedMediaInvalidError,
+    errors.PhotoInvalidDimensionsError, errors.PhotoExtInvalidError, errors.PhotoSaveFileInvalidError,
+    errors.ImageProcessFailedError, errors.WebpageCurlFailedError, errors.WebpageMediaEmptyError,
+    errors.PollOptionInvalidError
+)
+
+class AccountUnavailable(Exception):
+    """An account can't reach a chat, or no account is left to send with"""
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """The extra send accounts: a list of {"api_id", "api_hash", "phone"}"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('accounts', [])
+
+def save_accounts(accounts, path=ACCOUNTS_FILE):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'accounts': accounts}, f, indent=2)
+    os.replace(tmp_path, path)
+
+class SendAccount:
+    """A logged-in session sends can go out through, with its own limits and health"""
+
+    def __init__(self, phone, client, primary=False):
+        self.phone = phone
+        self.client = client
+        # The job's own account; it reads the source and uploads re-sent media
+        self.primary = primary
+        self.peers = {}
+        self.dialogs_loaded = False
+        # One limiter per destination with the route's settings, like a single account has
+        self.limiters = {}
+        self.cooldown_until = 0.0
+        self.failures = 0
+        self.disabled = None
+        self.requests = 0
+        self.messages_sent = 0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+
+    def limiter(self, route):
+        if self.primary:
+            return route.rate_limiter
+        limiter = self.limiters.get(route.dest_id)
+        if limiter is None:
+            limiter = self.limiters[route.dest_id] = route.rate_limiter.fresh()
+        return limiter
+
+    def state(self):
+        if self.disabled:
+            return 'logged out'
+        if self.cooldown_until > time.monotonic():
+            return 'cooling down'
+        return 'ok'
+
+    async def peer(self, chat_id):
+        """This account's input peer for a chat, which it has to be a member of"""
+        peer = self.peers.get(chat_id)
+        if peer is not None:
+            return peer
+        try:
+            peer = await self.client.get_input_entity(chat_id)
+        except ValueError:
+            if self.dialogs_loaded:
+                raise AccountUnavailable(f"{self.phone} is not a member of {chat_id}")
+            # A session only knows the chats it has seen, load them once
+            self.dialogs_loaded = True
+            await self.client.get_dialogs()
+            return await self.peer(chat_id)
+        self.peers[chat_id] = peer
+        return peer
+
+class AccountPool:
+    """Spreads sends over several accounts, routing around those in a cooldown
+
+    Each send takes the ready account with the most rate limiter budget
+    for the destination, then the one that sent least. A flood wait rests only the account that got
+    it; errors that are specific to an account put it in a longer
+    cooldown after max_failures in a row, or at once for PeerFloodError.
+    """
+
+    max_failures = 3
+    failure_cooldown = 300
+
+    def __init__(self, accounts, on_message=None):
+        self.accounts = list(accounts)
+        self.primary = next(account for account in self.accounts if account.primary)
+        self.on_message = on_message or ignore
+
+    def __len__(self):
+        return len(self.accounts)
+
+    async def acquire(self, route, primary_only=False):
+        """Wait for an account that may send to route and take a rate limiter token for it"""
+        while True:
+            now = time.monotonic()
+            usable = [account for account in ([self.primary] if primary_only else self.accounts)
+                      if account.disabled is None]
+            if not usable:
+                raise AccountUnavailable("No logged-in account is left to send with")
+            ready = [account for account in usable if account.cooldown_until <= now]
+            if ready:
+                # The most budget left, ties go to the account that sent least
+                account = max(ready, key=lambda account: (account.limiter(route).available(), -account.requests))
+                await account.limiter(route).acquire()
+                return account
+            await asyncio.sleep(min(account.cooldown_until for account in usable) - now)
+
+    def success(self, account, route, count):
+        account.failures = 0
+        account.messages_sent += count
+        account.limiter(route).success()
+
+    def flood_wait(self, account, route, seconds):
+        account.flood_waits += 1
+        account.flood_wait_seconds += seconds
+        route.flood_wait_seconds += seconds
+        account.cooldown_until = max(account.cooldown_until, time.monotonic() + seconds)
+        account.limiter(route).slow_down(seconds)
+
+    def failure(self, account, error):
+        """Count an account-specific error; returns whether another account can take over"""
+        if not any(other is not account and other.disabled is None for other in self.accounts):
+            # Nobody to hand the request to, the error goes to the caller as with a single account
+            return False
+        if isinstance(error, AUTH_ERRORS):
+            account.disabled = str(error)
+            self.on_message(f"⚠️ Account {account.phone} is logged out and no longer sends: {str(error)}")
+        else:
+            account.failures += 1
+            if isinstance(error, errors.PeerFloodError) or account.failures >= self.max_failures:
+                account.failures = 0
+                account.cooldown_until = time.monotonic() + self.failure_cooldown
+                self.on_message(
+                    f"⚠️ Account {account.phone} rests {self.failure_cooldown}s after: {str(error)}"
+                )
+        return True
+
+class CheckpointStore:
+    """Remembers the last copied message ID per (source, destination, filters)
+
+    Checkpoints resume an interrupted copy and are cleared once it
+    finishes; high water marks outlive them and let an incremental run
+    start after everything the previous finished run covered.
+    Checkpoints of a copy limited to an ID range are kept apart from
+    those of whole-history copies, id_range being its (min_id, max_id).
+    """
+
+    def __init__(self, path='forwarder_state.db'):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                source_id INTEGER NOT NULL,
+                dest_id INTEGER NOT NULL,
+                filters TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (source_id, dest_id, filters)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS high_water_marks (
+                source_id INTEGER NOT NULL,
+                dest_id INTEGER NOT NULL,
+                filters TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (source_id, dest_id, filters)
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def filters_key(filters, id_range=(0, 0)):
+        if any(id_range):
+            return json.dumps({'filters': filters, 'id_range': list(id_range)}, sort_keys=True)
+        return json.dumps(filters, sort_keys=True)
+
+    def load(self, source_id, dest_id, filters, id_range=(0, 0)):
+        row = self.conn.execute(
+            "SELECT last_message_id FROM checkpoints WHERE source_id = ? AND dest_id = ? AND filters = ?",
+            (source_id, dest_id, self.filters_key(filters, id_range))
+        ).fetchone()
+        return row[0] if row else 0
+
+    def save(self, source_id, dest_id, filters, message_id, id_range=(0, 0)):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+            (source_id, dest_id, self.filters_key(filters, id_range), message_id, datetime.now().isoformat())
+        )
+        self.conn.commit()
+
+    def clear(self, source_id, dest_id, filters, id_range=(0, 0)):
+        self.conn.execute(
+            "DELETE FROM checkpoints WHERE source_id = ? AND dest_id = ? AND filters = ?",
+            (source_id, dest_id, self.filters_key(filters, id_range))
+        )
+        self.conn.commit()
+
+    def load_high_water(self, source_id, dest_id, filters):
+        """Highest source message ID a finished history copy covered, 0 if none finished"""
+        row = self.conn.execute(
+            "SELECT last_message_id FROM high_water_marks WHERE source_id = ? AND dest_id = ? AND filters = ?",
+            (source_id, dest_id, self.filters_key(filters))
+        ).fetchone()
+        return row[0] if row else 0
+
+    def save_high_water(self, source_id, dest_id, filters, message_id):
+        """Raise the mark to message_id, an older copy finishing later never lowers it"""
+        self.conn.execute(
+            """
+            INSERT INTO high_water_marks VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (source_id, dest_id, filters) DO UPDATE SET
+                last_message_id = MAX(last_message_id, excluded.last_message_id),
+                updated_at = excluded.updated_at
+            """,
+            (source_id, dest_id, self.filters_key(filters), message_id, datetime.now().isoformat())
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def content_key(message):
+    """Identify a message's content: the file for media, a normalized text hash otherwise"""
+    media = message.media
+    photo = getattr(media, 'photo', None)
+    if getattr(photo, 'id', None):
+        return f"photo:{photo.id}"
+    document = getattr(media, 'document', None)
+    if getattr(document, 'id', None):
+        return f"doc:{document.id}"
+    if message.text:
+        normalized = ' '.join(message.text.lower().split())
+        return 'text:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    return None
+
+def content_size(message):
+    """Best estimate of the bytes a send of this message moves"""
+    media = message.media
+    document = getattr(media, 'document', None)
+    if getattr(document, 'size', None):
+        return document.size
+    photo = getattr(media, 'photo', None)
+    if photo is not None:
+        sizes = [getattr(size, 'size', 0) or max(getattr(size, 'sizes', None) or [0])
+                 for size in getattr(photo, 'sizes', None) or []]
+        return max(sizes or [0])
+    return len((message.text or '').encode('utf-8'))
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+def media_file_name(message):
+    """File name to upload a message's media under; the extension decides photo vs document"""
+    document = getattr(message.media, 'document', None)
+    if document is None:
+        return 'photo.jpg'
+    for attribute in getattr(document, 'attributes', None) or []:
+        if isinstance(attribute, types.DocumentAttributeFilename):
+            return attribute.file_name
+    return 'file' + (mimetypes.guess_extension(getattr(document, 'mime_type', None) or '') or '')
+
+# A .part file untouched this long is left from a download that died; younger ones may be another process's
+STALE_PART_SECONDS = 3600
+
+class MediaSpool:
+    """Downloaded media on disk, keyed by Telegram file ID, trimmed to max_bytes least recently used first
+
+    Files survive restarts; their modification time records the last use.
+    Files being uploaded are never evicted. Jobs share one spool through
+    ClientManager.media_spool, and with it the downloads in progress.
+    """
+
+    def __init__(self, directory='media_spool', max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.in_use = Counter()
+        self.pending = {}
+        os.makedirs(directory, exist_ok=True)
+        files = sorted((entry for entry in os.scandir(directory) if entry.is_file()),
+                       key=lambda entry: entry.stat().st_mtime)
+        now = time.time()
+        for entry in files:
+            if entry.name.endswith('.part'):
+                if now - entry.stat().st_mtime > STALE_PART_SECONDS:
+                    # Left over from an interrupted download
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                continue
+            self.entries[os.path.splitext(entry.name)[0]] = (entry.path, entry.stat().st_size)
+            self.total_bytes += entry.stat().st_size
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        path, size = entry
+        if not os.path.exists(path):
+            del self.entries[key]
+            self.total_bytes -= size
+            return None
+        self.entries.move_to_end(key)
+        os.utime(path)
+        return path
+
+    def add(self, key, path):
+        if key in self.entries:
+            self.total_bytes -= self.entries[key][1]
+        size = os.path.getsize(path)
+        self.entries[key] = (path, size)
+        self.entries.move_to_end(key)
+        self.total_bytes += size
+        self.evict()
+
+    def evict(self):
+        for key in list(self.entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if self.in_use[key]:
+                continue
+            path, size = self.entries.pop(key)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def fetch(self, key, download):
+        """Path of the file for key, spooled by download() if it isn't yet
+
+        download() returns the path of a new file. Callers asking for the
+        same key at once share one download; they hold using(key).
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self.download(key, download))
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        # Shielded, as a stopping job must not cancel a download others wait for
+        return await asyncio.shield(task)
+
+    async def download(self, key, download):
+        path = await download()
+        self.add(key, path)
+        return path
+
+    @contextmanager
+    def using(self, key):
+        self.in_use[key] += 1
+        try:
+            yield
+        finally:
+            self.in_use[key] -= 1
+            if not self.in_use[key]:
+                del self.in_use[key]
+
+class MediaTransfer:
+    """Re-uploads media for sources that don't allow forwarding
+
+    Each file is downloaded into a MediaSpool and uploaded again, with up
+    to `workers` files in flight. Files of parallel_threshold bytes or
+    more are moved in part_size parts, parts_in_flight at a time. A file
+    is downloaded at most once while it stays in the spool, and uploaded
+    at most once per job while its upload is younger than upload_ttl, however
+    many destinations or retries use it.
+    """
+
+    part_size = 512 * 1024
+    # Telegram's limit for single-request uploads; bigger files use the "big file" API
+    parallel_threshold = 10 * 1024 * 1024
+
+    def __init__(self, client, workers=4, parts_in_flight=4, spool=None, upload_ttl=1800, tracer=NULL_TRACER):
+        self.client = client
+        self.tracer = tracer
+        self.workers = asyncio.Semaphore(workers)
+        self.parts_in_flight = parts_in_flight
+        self.spool = spool or MediaSpool()
+        # Telegram keeps uploaded parts for a limited time, so handles expire
+        self.upload_ttl = upload_ttl
+        self.uploads = {}
+        self.pending = {}
+
+    async def prepare_unit(self, unit):
+        """Upload the media of every message in a unit, returning the InputMedia to send"""
+        return await asyncio.gather(*(self.prepare(message) for message, _ in unit))
+
+    async def prepare(self, message):
+        media = message.media
+        photo = getattr(media, 'photo', None)
+        document = getattr(media, 'document', None)
+        if not photo and not document:
+            # Nothing to transfer (no media, or a poll, location, contact...)
+            return media
+
+        uploaded = await self.uploaded_file(message)
+        if document is None:
+            return types.InputMediaUploadedPhoto(file=uploaded)
+        return types.InputMediaUploadedDocument(
+            file=uploaded,
+            mime_type=getattr(document, 'mime_type', None) or 'application/octet-stream',
+            attributes=getattr(document, 'attributes', None) or [],
+            force_file=False
+        )
+
+    async def uploaded_file(self, message):
+        key = content_key(message).replace(':', '_')
+        cached = self.uploads.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        # Destinations asking for the same file at once share one transfer
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self.transfer(message, key))
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        # Shielded, as a stopping route must not cancel a transfer others wait for
+        return await asyncio.shield(task)
+
+    async def transfer(self, message, key):
+        async with self.workers:
+            with self.spool.using(key):
+                path = self.spool.get(key)
+                if path is None:
+                    with self.tracer.span('download', file=key):
+                        path = await self.spool.fetch(key, lambda: self.download(message, key))
+                with self.tracer.span('upload', file=key):
+                    uploaded = await self.upload(path, media_file_name(message))
+            self.spool.evict()
+        self.uploads[key] = (uploaded, time.monotonic() + self.upload_ttl)
+        return uploaded
+
+    async def download(self, message, key):
+        path = os.path.join(self.spool.directory, key + os.path.splitext(media_file_name(message))[1])
+        # Downloaded under a temporary name of its own, so a crash never leaves a truncated file in the
+        # spool and another process downloading the same file doesn't write to the same one
+        fd, part_path = tempfile.mkstemp(prefix=key + '.', suffix='.part', dir=self.spool.directory)
+        os.close(fd)
+        size = getattr(getattr(message.media, 'document', None), 'size', 0) or 0
+        try:
+            if size < self.parallel_threshold:
+                await self.client.download_media(message.media, file=part_path)
+            else:
+                with open(part_path, 'wb') as f:
+                    f.truncate(size)
+                # Every range starts on a part boundary, as Telegram requires
+                parts = math.ceil(size / self.part_size)
+                per_range = math.ceil(parts / self.parts_in_flight)
+                await asyncio.gather(*(
+                    self.download_range(message.media, part_path, first, min(per_range, parts - first), size)
+                    for first in range(0, parts, per_range)
+                ))
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, path)
+        return path
+
+    async def download_range(self, media, path, first_part, part_count, size):
+        with open(path, 'r+b') as f:
+            f.seek(first_part * self.part_size)
+            async for chunk in self.client.iter_download(
+                media, offset=first_part * self.part_size, limit=part_count,
+                chunk_size=self.part_size, request_size=self.part_size, file_size=size
+            ):
+                f.write(chunk)
+
+    async def upload(self, path, name):
+        size = os.path.getsize(path)
+        if size < self.parallel_threshold:
+            return await self.client.upload_file(path, file_name=name)
+
+        file_id = helpers.generate_random_long()
+        total_parts = math.ceil(size / self.part_size)
+        next_parts = iter(range(total_parts))
+
+        async def upload_parts():
+            with open(path, 'rb') as f:
+                for part in next_parts:
+                    f.seek(part * self.part_size)
+                    data = f.read(self.part_size)
+                    while True:
+                        try:
+                            await self.client(functions.upload.SaveBigFilePartRequest(
+                                file_id, part, total_parts, data
+                            ))
+                            break
+                        except errors.FloodWaitError as e:
+                            with self.tracer.span('flood wait', part=part):
+                                await asyncio.sleep(e.seconds)
+
+        # The workers share one iterator, each taking the next part when it is free
+        await asyncio.gather(*(upload_parts() for _ in range(self.parts_in_flight)))
+        return types.InputFileBig(file_id, total_parts, name)
+
+# Sent keys read per query while the dedup index loads
+DEDUP_LOAD_PAGE = 50000
+
+class BloomFilter:
+    """Fixed-size Bloom filter: answers "definitely new" without touching the disk"""
+
+    def __init__(self, size_bits=1 << 23, hashes=5):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.bits = bytearray(size_bits // 8)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size_bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+    def update(self, other):
+        """Add the keys of another filter of the same size"""
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(merged.to_bytes(len(self.bits), 'little'))
+
+class DedupIndex:
+    """Remembers which content was already sent to each destination
+
+    Keys live in SQLite; a 1 MB Bloom filter in front of it keeps lookups
+    for new content off the disk, so memory stays bounded however many
+    messages were sent.
+
+    The filter is filled from the keys already sent on a thread of its
+    own, as that can take a while and the client loop is shared by every
+    job. Until it is ready every lookup goes to SQLite.
+    """
+
+    def __init__(self, path='forwarder_state.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sent_content (
+                dest_id INTEGER NOT NULL,
+                content_key TEXT NOT NULL,
+                PRIMARY KEY (dest_id, content_key)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        self.bloom = BloomFilter()
+        self.ready = False
+        self.lock = threading.Lock()
+        threading.Thread(target=self.load_bloom, name='dedup-index', daemon=True).start()
+
+    def load_bloom(self):
+        bloom = BloomFilter()
+        conn = sqlite3.connect(self.path)
+        try:
+            # In pages, so the loop's own writes aren't locked out for the whole read
+            query = "SELECT dest_id, content_key FROM sent_content {} ORDER BY dest_id, content_key LIMIT ?"
+            rows = conn.execute(query.format(''), (DEDUP_LOAD_PAGE,)).fetchall()
+            while rows:
+                for dest_id, key in rows:
+                    bloom.add(f"{dest_id}:{key}")
+                if len(rows) < DEDUP_LOAD_PAGE:
+                    break
+                rows = conn.execute(query.format("WHERE (dest_id, content_key) > (?, ?)"),
+                                    (*rows[-1], DEDUP_LOAD_PAGE)).fetchall()
+        except sqlite3.Error:
+            # Lookups keep going to SQLite
+            return
+        finally:
+            conn.close()
+        with self.lock:
+            # Keys added while loading
+            bloom.update(self.bloom)
+            self.bloom = bloom
+            self.ready = True
+
+    def seen(self, dest_id, key):
+        if self.ready and f"{dest_id}:{key}" not in self.bloom:
+            return False
+        return self.conn.execute(
+            "SELECT 1 FROM sent_content WHERE dest_id = ? AND content_key = ?", (dest_id, key)
+        ).fetchone() is not None
+
+    def add(self, dest_id, keys):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO sent_content VALUES (?, ?)", [(dest_id, key) for key in keys]
+        )
+        self.conn.commit()
+        with self.lock:
+            for key in keys:
+                self.bloom.add(f"{dest_id}:{key}")
+
+    def close(self):
+        self.conn.close()
+
+class DestinationRoute:
+    """Send queue, rate limit, checkpoint and progress for one destination"""
+
+    def __init__(self, dest_id):
+        self.dest_id = dest_id
+        self.name = str(dest_id)
+        self.peer = None
+        self.queue = None
+        self.rate_limiter = RateLimiter()
+        self.server_forward = True
+        self.start_id = 0
+        self.handled_id = 0
+        self.messages_processed = 0
+        self.requests_made = 0
+        self.duplicates_skipped = 0
+        self.bytes_saved = 0
+        self.messages_failed = 0
+        self.bytes_sent = 0
+        self.flood_wait_seconds = 0
+        # Histogram of send request durations per account phone
+        self.send_latency = {}
+        self.complete = False
+        # Why sending stopped early (connection, account, auth or permission error), None while it can send
+        self.error = None
+
+    def observe_send(self, phone, seconds):
+        histogram = self.send_latency.get(phone)
+        if histogram is None:
+            histogram = self.send_latency[phone] = Histogram()
+        histogram.observe(seconds)
+
+    def progress(self, top_id):
+        """Percent of the history copied, capped at 99 until the copy is confirmed complete"""
+        if self.complete:
+            return 100
+        if top_id <= self.start_id:
+            return 99
+        return max(0, min(99, int((self.handled_id - self.start_id) / (top_id - self.start_id) * 100)))
+
+# One compact progress report for a job; routes holds (str(dest_id), name, percent) per destination
+MetricsSnapshot = namedtuple(
+    'MetricsSnapshot', ['sent', 'skipped', 'failed', 'bytes', 'rate', 'eta', 'progress', 'routes', 'live']
+)
+
+def format_metrics(snapshot):
+    """One status line for a MetricsSnapshot"""
+    parts = [f"{snapshot.sent} sent", f"{snapshot.rate:.1f} msg/s", format_bytes(snapshot.bytes)]
+    if snapshot.skipped:
+        parts.append(f"{snapshot.skipped} skipped")
+    if snapshot.failed:
+        parts.append(f"{snapshot.failed} failed")
+    if snapshot.eta is not None:
+        minutes, seconds = divmod(int(snapshot.eta), 60)
+        parts.append(f"ETA {minutes}m {seconds:02d}s")
+    return " · ".join(parts)
+
+class JobMetrics:
+    """Aggregates a job's route counters and publishes a MetricsSnapshot every interval seconds
+
+    Per-message progress is only counted on the routes; listeners get one
+    snapshot per interval however fast messages are copied.
+    """
+
+    def __init__(self, job, on_metrics=None, interval=0.5):
+        self.job = job
+        self.on_metrics = on_metrics or ignore
+        self.interval = interval
+        self.started = None
+        self.last_time = None
+        self.last_sent = 0
+        self.rate = 0.0
+        self.last_snapshot = None
+
+    def snapshot(self):
+        job = self.job
+        routes = job.routes
+        sent = sum(route.messages_processed for route in routes)
+        now = time.monotonic()
+        if self.last_time is None:
+            self.started = self.last_time = now
+            self.last_sent = sent
+        elif now > self.last_time:
+            # Smoothed messages/second since the previous snapshot
+            current = (sent - self.last_sent) / (now - self.last_time)
+            self.rate = current if not self.rate else 0.7 * self.rate + 0.3 * current
+            self.last_time = now
+            self.last_sent = sent
+
+        progress = None
+        eta = None
+        if job.top_id:
+            progress = min(route.progress(job.top_id) for route in routes)
+            if 0 < progress < 100:
+                eta = (now - self.started) * (100 - progress) / progress
+        return MetricsSnapshot(
+            sent=sent,
+            skipped=sum(route.duplicates_skipped for route in routes),
+            failed=sum(route.messages_failed for route in routes),
+            bytes=sum(route.bytes_sent for route in routes),
+            rate=self.rate,
+            eta=eta,
+            progress=progress,
+            routes=tuple((str(route.dest_id), route.name, route.progress(job.top_id) if job.top_id else None)
+                         for route in routes),
+            live=job.live and not job.forward_existing
+        )
+
+    def publish(self):
+        snapshot = self.snapshot()
+        if snapshot != self.last_snapshot:
+            self.last_snapshot = snapshot
+            self.on_metrics(snapshot)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.publish()
+
+# Weighted fair queuing weights of live forwarding and history copies
+LIVE_WEIGHT = 4
+BULK_WEIGHT = 1
+
+class FairQueue:
+    """Weighted fair queuing of sends from several jobs through one shared rate limiter
+
+    Each send gets a virtual finish tag: the later of the queue's virtual
+    time and its job's previous tag, plus cost / weight. Sends go out in
+    tag order, so under contention a job of weight 4 gets four times the
+    sends of a job of weight 1, and an idle job can't save up credit.
+    """
+
+    def __init__(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+        self.virtual_time = 0.0
+        self.finish_tags = {}
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.dispatcher = None
+
+    async def acquire(self, job, weight, cost=1):
+        """Wait for the job's turn and a token from the shared limiter"""
+        tag = max(self.virtual_time, self.finish_tags.get(job, 0.0)) + cost / weight
+        self.finish_tags[job] = tag
+        turn = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (tag, next(self.sequence), turn))
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.ensure_future(self.dispatch())
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if all(waiting.done() for _, _, waiting in self.waiting):
+                # Nobody is left to take the token the dispatcher may be waiting hours for
+                self.waiting.clear()
+                self.dispatcher.cancel()
+            raise
+
+    async def dispatch(self):
+        while self.waiting:
+            # Pick the send only once a token is free, so sends queued in the meantime compete for it
+            await self.rate_limiter.acquire()
+            while self.waiting:
+                tag, _, turn = heapq.heappop(self.waiting)
+                if not turn.done():
+                    # Not cancelled while waiting
+                    self.virtual_time = tag
+                    turn.set_result(None)
+                    break
+
+    def forget(self, job):
+        self.finish_tags.pop(job, None)
+
+class JobScheduler:
+    """Runs forwarding jobs concurrently as tasks on the client loop
+
+    Jobs of the same account share its send budget through a FairQueue,
+    so a large backfill can't starve a live route. Every method may be
+    called from any thread.
+    """
+
+    # Seconds a cancelled job gets to finish its in-flight sends before its task is cancelled
+    cancel_grace = 2.0
+
+    def __init__(self, client_manager, rate=20.0, burst=20, on_finished=None):
+        self.client_manager = client_manager
+        self.rate = rate
+        self.burst = burst
+        self.on_finished = on_finished or ignore
+        self.ids = itertools.count(1)
+        self.jobs = {}
+        self.futures = {}
+        self.queues = {}
+        self.cancelled = set()
+
+    def submit(self, job):
+        """Start a job and return its ID"""
+        job_id = next(self.ids)
+        queue = self.queues.get(job.phone)
+        if queue is None:
+            queue = self.queues[job.phone] = FairQueue(
+                RateLimiter(self.rate, self.burst, min_rate=1.0, max_rate=self.rate)
+            )
+        job.fair_queue = queue
+        self.jobs[job_id] = job
+        future = self.client_manager.submit(job.forward_with_metrics())
+        self.futures[job_id] = future
+        future.add_done_callback(lambda future: self.finished(job_id))
+        return job_id
+
+    def finished(self, job_id):
+        job = self.jobs[job_id]
+        self.client_manager.call_soon(job.fair_queue.forget, job)
+        self.on_finished(job_id)
+
+    def state(self, job_id):
+        job = self.jobs[job_id]
+        # A job is registered just before its future, a scrape can fall in between
+        future = self.futures.get(job_id)
+        if future is not None and future.done():
+            return 'cancelled' if job_id in self.cancelled else 'done'
+        if job.paused:
+            return 'paused'
+        return 'copying' if job.forward_existing else 'live'
+
+    def pause(self, job_id):
+        self.client_manager.call_soon(self.jobs[job_id].pause)
+
+    def resume(self, job_id):
+        self.client_manager.call_soon(self.jobs[job_id].resume)
+
+    def cancel(self, job_id):
+        """Stop a job after its in-flight sends; it saves its checkpoint like any stop
+
+        A job still running after cancel_grace seconds, asleep in a flood
+        wait or an account cooldown for example, has its task cancelled.
+        """
+        self.cancelled.add(job_id)
+        self.jobs[job_id].stop()
+        # A paused job wakes up to notice
+        self.resume(job_id)
+        self.client_manager.call_soon(self.cancel_after_grace, self.futures[job_id])
+
+    def cancel_after_grace(self, future):
+        asyncio.get_event_loop().call_later(self.cancel_grace, future.cancel)
+
+    def running(self):
+        return [job_id for job_id, future in self.futures.items() if not future.done()]
+
+    def stop_all(self, timeout=5):
+        """Stop every job and wait up to timeout seconds in all for them to save their progress"""
+        for job_id in self.running():
+            self.cancel(job_id)
+        concurrent.futures.wait(list(self.futures.values()), timeout=timeout)
+
+# What ForwardingJob.send_request returns when the job stopped before the request went out
+NOT_SENT = object()
+
+class ForwardingJob:
+    """Copies a source chat's history and/or live posts to one or more destinations"""
+
+    def __init__(self, client_manager, api_id, api_hash, phone, source_id, dest_ids, filters,
+                 forward_existing=True, copy_mode='copy', live=False, dedup=True, min_id=0, max_id=0,
+                 incremental=False, send_accounts=(), priority=None,
+                 transfer_workers=4, preserve_order=True, spool_limit=1 << 30, trace_file=None,
+                 on_message=None, on_error=None, on_metrics=None, metrics_interval=0.5):
+        self.on_message = on_message or ignore
+        self.error_callback = on_error or ignore
+        self.client_manager = client_manager
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.phone = phone
+        self.source_id = source_id
+        self.dest_ids = list(dest_ids)
+        self.filters = filters
+        # Compiled once; raises ValueError for invalid rules
+        self.message_filter = MessageFilter(filters)
+        # History reads ask Telegram for candidates only and check the rest locally
+        self.query_plan = QueryPlan(self.message_filter)
+        self.is_running = True
+        self.client = None
+        self.retry_count = 0
+        self.max_retries = 5
+        self.reconnect_interval = 5
+        self.forward_existing = forward_existing
+        # The history copy only covers min_id < ID < max_id (0 for no bound); dates are the after/before rules
+        self.min_id = min_id
+        self.max_id = max_id
+        # Start after the highest ID the last finished copy covered, reading only what is new
+        self.incremental = incremental
+        self.messages_scanned = 0
+        self.messages_filtered = 0
+        # Counted for the metrics endpoint
+        self.reconnects = 0
+        self.errors_reported = 0
+        self.queue_size = 200
+        # 'copy' drops the "Forwarded from" header, 'forward' keeps it
+        self.copy_mode = copy_mode
+        self.batch_size = 100
+        # The source is read once and fanned out to every destination
+        self.routes = [DestinationRoute(dest_id) for dest_id in self.dest_ids]
+        self.source_peer = None
+        self.checkpoints = None
+        self.top_id = 0
+        self.last_read_id = 0
+        self.history_exhausted = False
+        # Live mode keeps forwarding new posts after the history copy
+        self.live = live
+        self.live_backlog = None
+        # A live-only job must not leave a checkpoint that a later history copy would resume from
+        self.checkpoint_live = forward_existing
+        # Skip content (same file or same text) already sent to a destination
+        self.dedup = dedup
+        self.dedup_index = None
+        # Re-sent media goes through a pool of transfer_workers downloads/uploads.
+        # preserve_order=False lets a message go out as soon as its media is
+        # ready instead of waiting for the ones before it.
+        self.transfer_workers = transfer_workers
+        self.preserve_order = preserve_order
+        # Bytes of downloaded media kept in media_spool/ for retries, other destinations and later runs
+        self.spool_limit = spool_limit
+        self.media_transfer = None
+        # Extra logged-in accounts ({"api_id", "api_hash", "phone"}) that share the sending
+        self.send_accounts = list(send_accounts)
+        self.account_pool = None
+        # Set by a JobScheduler running several jobs; priority 'high' or 'bulk' overrides
+        # the default of high for live forwarding and bulk for history copies
+        self.fair_queue = None
+        if priority not in (None, 'high', 'bulk'):
+            raise ValueError(f"priority must be 'high' or 'bulk', got {priority!r}")
+        self.priority = priority
+        self.paused = False
+        # With a trace_file, stage timings are recorded and written there as a Chrome trace
+        self.trace_file = trace_file
+        self.tracer = NULL_TRACER
+        # Progress goes out as a MetricsSnapshot every metrics_interval seconds
+        self.metrics = JobMetrics(self, on_metrics, metrics_interval)
+
+    def on_error(self, error):
+        self.errors_reported += 1
+        self.error_callback(error)
+
+    async def connect_client(self):
+        try:
+            if self.client and self.client.is_connected():
+                return True
+
+            self.client = await self.client_manager.get_client(self.api_id, self.api_hash, self.phone)
+
+            if not await self.client.is_user_authorized():
+                self.on_error("Please login first!")
+                return False
+
+            return True
+        except Exception as e:
+            self.on_error(f"Connection error: {str(e)}")
+            return False
+
+    def classify_message(self, message):
+        """Return the message type if it passes the filters, otherwise None"""
+        return self.message_filter(message)
+
+    async def iter_units(self, messages, classify=None):
+        """Filter messages and group albums (shared grouped_id) into send units"""
+        classify = self.tracer.timed('filter', classify or self.classify_message)
+        album = []
+        async for message in self.tracer.iter_pages('fetch', messages):
+            if not self.is_running:
+                return
+
+            self.messages_scanned += 1
+            self.last_read_id = message.id
+            if album and message.grouped_id != album[0][0].grouped_id:
+                yield album
+                album = []
+
+            message_type = classify(message)
+            if not message_type:
+                self.messages_filtered += 1
+                continue
+            if message.grouped_id:
+                album.append((message, message_type))
+            else:
+                yield [(message, message_type)]
+
+        if album:
+            yield album
+
+    async def fan_out(self, unit):
+        """Queue a unit for every destination that hasn't copied it yet"""
+        for route in self.routes:
+            if unit[-1][0].id > route.start_id and route.error is None:
+                await route.queue.put(unit)
+
+    def stop_route(self, route, error):
+        """Stop sending to a destination after an error that isn't about the messages
+
+        Its checkpoint stays at the last batch it handled, so the next run
+        resumes there. The job stops once no destination is left.
+        """
+        route.error = str(error)
+        self.on_error(
+            f"⛔ Stopped sending to {route.name}, the next run resumes after message #{route.handled_id}: {str(error)}"
+        )
+        # Nothing reads this queue anymore, free a reader waiting to put into it
+        while route.queue is not None and not route.queue.empty():
+            route.queue.get_nowait()
+        if all(other.error is not None for other in self.routes):
+            self.on_error("No destination left to send to, stopping")
+            self.stop()
+
+    def iter_history(self, min_id=0, max_id=0):
+        """Units of the source history between min_id and max_id, read through the query plan"""
+        messages = self.query_plan.iter_messages(self.client, self.source_id, min_id=min_id, max_id=max_id)
+        return self.iter_units(messages, self.query_plan.residual)
+
+    async def read_history(self):
+        """Producer: stream the source history oldest-first into every destination queue"""
+        try:
+            # reverse=True pages through the history from the oldest message,
+            # so nothing has to be buffered to restore chronological order
+            # min_id skips everything all destinations already committed
+            start_id = min(route.start_id for route in self.routes)
+            async for unit in self.iter_history(start_id, self.max_id):
+                # Blocks while the slowest sender is behind, keeping memory flat
+                await self.fan_out(unit)
+            if self.is_running:
+                self.history_exhausted = True
+        except Exception as e:
+            self.on_error(f"Error reading messages: {str(e)}")
+
+        # Tell the senders there is nothing more to copy
+        for route in self.routes:
+            if route.error is None:
+                await route.queue.put(None)
+
+    async def next_batch(self, queue, held=None):
+        """Wait for the next unit, then take whatever else is already queued
+
+        Returns the batch, a unit held back for the next batch and whether
+        the end of the queue was reached.
+        """
+        unit = held or await queue.get()
+        if unit is None:
+            return None, None, True
+
+        batch = [unit]
+        size = len(unit)
+        while size < self.batch_size:
+            try:
+                unit = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if unit is None:
+                return batch, None, True
+            if size + len(unit) > self.batch_size:
+                # Never split an album across two requests
+                return batch, unit, False
+            batch.append(unit)
+            size += len(unit)
+        return batch, None, False
+
+    async def connect_send_accounts(self):
+        """Build the send pool from this job's account and the extra accounts that are logged in"""
+        primary = SendAccount(self.phone, self.client, primary=True)
+        primary.peers[self.source_id] = self.source_peer
+        for route in self.routes:
+            primary.peers[route.dest_id] = route.peer
+        accounts = [primary]
+
+        extra = [account for account in self.send_accounts if account.get('phone') != self.phone]
+        if extra and not isinstance(self.source_peer, types.InputPeerChannel):
+            # Other accounts see other message IDs outside channels and supergroups
+            self.on_message("⚠️ Extra accounts can only forward from channels and supergroups, sending from one account")
+            extra = []
+        for account in extra:
+            try:
+                client = await self.client_manager.get_client(int(account['api_id']), account['api_hash'],
+                                                              account['phone'])
+                if not await client.is_user_authorized():
+                    self.on_error(f"Account {account['phone']} is not logged in, sending without it")
+                    continue
+                accounts.append(SendAccount(account['phone'], client))
+            except Exception as e:
+                self.on_error(f"Error connecting account {account['phone']}: {str(e)}")
+        if len(accounts) > 1:
+            self.on_message(f"👥 Sending from {len(accounts)} accounts")
+        self.account_pool = AccountPool(accounts, on_message=self.on_message)
+
+    async def send_request(self, route, make_request, count=1, primary_only=False):
+        """Send through the account pool, retrying the same request after a flood wait
+
+        make_request takes the SendAccount to send from. A flood wait or an
+        account-specific error moves the request to another account when
+        there is one; primary_only keeps it on the job's own account, e.g.
+        for media that account uploaded. Returns NOT_SENT when the job
+        stopped first.
+        """
+        pool = self.account_pool
+        tracer = self.tracer
+        while self.is_running:
+            with tracer.span('rate wait', route=route.name):
+                while self.paused and self.is_running:
+                    await asyncio.sleep(0.2)
+                if self.fair_queue:
+                    await self.fair_queue.acquire(self, self.weight())
+                account = await pool.acquire(route, primary_only)
+            started = time.perf_counter()
+            try:
+                with tracer.span('send', route=route.name, account=account.phone, messages=count):
+                    result = await make_request(account)
+            except errors.FloodWaitError as e:
+                # The wait itself is spent in the next 'rate wait', this shows why
+                tracer.add('flood wait', time.perf_counter(), e.seconds, lane=f'flood waits {account.phone}',
+                           route=route.name)
+                if len(pool) > 1:
+                    self.on_message(f"⏳ Flood wait for {account.phone} on {route.name}: it rests {e.seconds}s")
+                else:
+                    self.on_message(f"⏳ Flood wait on {route.name}: pausing {e.seconds}s before retrying")
+                pool.flood_wait(account, route, e.seconds)
+                if self.fair_queue and len(pool) == 1:
+                    # The flood limit is the account's, so the other jobs on it wait too
+                    self.fair_queue.rate_limiter.slow_down(e.seconds)
+                continue
+            except ACCOUNT_ERRORS + AUTH_ERRORS + (AccountUnavailable,) as e:
+                if primary_only or not pool.failure(account, e):
+                    raise
+                continue
+            finally:
+                route.requests_made += 1
+                account.requests += 1
+                route.observe_send(account.phone, time.perf_counter() - started)
+            pool.success(account, route, count)
+            return result
+        return NOT_SENT
+
+    async def forward_batch(self, route, messages):
+        """Forward up to batch_size messages server-side in a single request
+
+        Albums stay grouped at the destination because all of their
+        messages are forwarded together.
+        """
+        async def forward(account):
+            return await account.client(functions.messages.ForwardMessagesRequest(
+                from_peer=await account.peer(self.source_id),
+                id=[message.id for message, _ in messages],
+                random_id=[helpers.generate_random_long() for _ in messages],
+                to_peer=await account.peer(route.dest_id),
+                drop_author=self.copy_mode == 'copy'
+            ))
+
+        return await self.send_request(route, forward, count=len(messages))
+
+    async def resend_unit(self, route, unit, media):
+        """Re-send one message, or one album as a single multi-file request, with uploaded media
+
+        Uploaded files belong to the account that uploaded them, so media
+        goes out through the job's own account; text through any. Media
+        without a file (web page previews, polls, locations...) can't be
+        sent again, only the message text goes. Returns NOT_SENT when the
+        job stopped first.
+        """
+        if len(unit) > 1:
+            captions = [message.text or '' for message, _ in unit]
+
+            async def send_album(account):
+                return await account.client.send_file(route.peer, media, caption=captions)
+
+            return await self.send_request(route, send_album, count=len(unit), primary_only=True)
+
+        message = unit[0][0]
+
+        async def send_text(account):
+            return await account.client.send_message(await account.peer(route.dest_id), message.text)
+
+        has_file = getattr(message.media, 'photo', None) or getattr(message.media, 'document', None)
+        result = None
+        if message.text:
+            result = await self.send_request(route, send_text)
+        if has_file and result is not NOT_SENT:
+            result = await self.send_request(route, lambda account: account.client.send_file(route.peer, media[0]),
+                                             primary_only=True)
+        return result
+
+    async def resend_batch(self, route, batch):
+        """Re-send units one by one, for sources that don't allow forwarding
+
+        The transfer pool downloads and uploads the batch's media ahead of
+        the sends. Without preserve_order each unit goes out as soon as its
+        media is ready, so text and small files don't wait behind a large
+        video; with it the sends keep the source order. Returns the ID up to which the batch was handled, failed units
+        included, and the messages that were actually sent.
+        """
+        if self.media_transfer is None:
+            spool = self.client_manager.media_spool(max_bytes=self.spool_limit)
+            self.media_transfer = MediaTransfer(self.client, self.transfer_workers, spool=spool,
+                                                tracer=self.tracer)
+        prepared = [asyncio.ensure_future(self.media_transfer.prepare_unit(unit)) for unit in batch]
+        handled = [False] * len(batch)
+        sent = [False] * len(batch)
+
+        async def resend(index):
+            unit = batch[index]
+            try:
+                media = await prepared[index]
+                if await self.resend_unit(route, unit, media) is NOT_SENT:
+                    return
+                sent[index] = True
+                route.messages_processed += len(unit)
+                route.bytes_sent += sum(content_size(message) for message, _ in unit)
+            except MESSAGE_ERRORS as send_error:
+                route.messages_failed += len(unit)
+                message_type = "Album" if len(unit) > 1 else unit[0][1]
+                self.on_error(f"Error copying {message_type} message to {route.name}: {str(send_error)}")
+            except Exception as send_error:
+                route.messages_failed += len(unit)
+                if route.error is None:
+                    self.stop_route(route, send_error)
+                return
+            handled[index] = True
+
+        try:
+            if self.preserve_order:
+                for index in range(len(batch)):
+                    if not self.is_running or route.error is not None:
+                        break
+                    await resend(index)
+            else:
+                await asyncio.gather(*(resend(index) for index in range(len(batch))))
+        finally:
+            for task in prepared:
+                task.cancel()
+            await asyncio.gather(*prepared, return_exceptions=True)
+
+        # Only the units up to the first unfinished one count as handled
+        handled_id = 0
+        for index, unit in enumerate(batch):
+            if not handled[index]:
+                break
+            handled_id = unit[-1][0].id
+        return handled_id, [item for index, unit in enumerate(batch) if sent[index] for item in unit]
+
+    def skip_duplicates(self, route, batch):
+        """Drop messages whose content was already sent to this destination"""
+        kept = []
+        keys_in_batch = set()
+        for unit in batch:
+            new_unit = []
+            for message, message_type in unit:
+                key = content_key(message)
+                if key and (key in keys_in_batch or self.dedup_index.seen(route.dest_id, key)):
+                    route.duplicates_skipped += 1
+                    route.bytes_saved += content_size(message)
+                    continue
+                if key:
+                    keys_in_batch.add(key)
+                new_unit.append((message, message_type))
+            if new_unit:
+                kept.append(new_unit)
+        return kept
+
+    async def send_history(self, route):
+        """Consumer: copy a route's queued messages to its destination in batches"""
+        held = None
+        finished = False
+        while self.is_running and not finished:
+            batch, held, finished = await self.next_batch(route.queue, held)
+            if not batch:
+                break
+
+            last_id = batch[-1][-1][0].id
+            skipped_before = route.duplicates_skipped
+            if self.dedup_index:
+                batch = self.skip_duplicates(route, batch)
+
+            messages = [item for unit in batch for item in unit]
+            sent_before = route.messages_processed
+            # A batch of nothing but duplicates is handled without sending
+            handled_id = 0 if messages else last_id
+            # Messages that failed on their own count as handled for the checkpoint, only these go in the dedup index
+            sent = []
+            if messages and route.server_forward:
+                try:
+                    if await self.forward_batch(route, messages) is not NOT_SENT:
+                        # Forwards move no bytes through this client, only re-sends count in bytes_sent
+                        route.messages_processed += len(messages)
+                        handled_id = last_id
+                        sent = messages
+                except errors.ChatForwardsRestrictedError:
+                    route.server_forward = False
+                    self.on_message("⚠️ Source doesn't allow forwarding, re-sending messages instead")
+                except MESSAGE_ERRORS as send_error:
+                    route.messages_failed += len(messages)
+                    self.on_error(
+                        f"Error forwarding {len(messages)} messages to {route.name}: {str(send_error)}"
+                    )
+                    handled_id = last_id
+                except Exception as send_error:
+                    route.messages_failed += len(messages)
+                    self.stop_route(route, send_error)
+                    break
+
+            if messages and not route.server_forward:
+                handled_id, sent = await self.resend_batch(route, batch)
+                if handled_id == messages[-1][0].id:
+                    handled_id = last_id
+
+            if handled_id:
+                route.handled_id = handled_id
+                if self.checkpoints:
+                    self.checkpoints.save(self.source_id, route.dest_id, self.filters, handled_id,
+                                          (self.min_id, self.max_id))
+            if sent and self.dedup_index:
+                keys = [content_key(message) for message, _ in sent]
+                self.dedup_index.add(route.dest_id, [key for key in keys if key])
+
+            if route.error is not None:
+                break
+            skipped = route.duplicates_skipped - skipped_before
+            self.on_message(
+                f"✅ Copied {route.messages_processed - sent_before} messages to {route.name} "
+                f"({route.messages_processed} copied, {self.messages_scanned} read"
+                + (f", {skipped} duplicates skipped)" if skipped else ")")
+            )
+
+    async def run_senders(self, reader, live=False):
+        """Run one sender per destination next to the reader task
+
+        A history copy waits for the senders to drain their queues. In live
+        mode the reader only returns on stop or disconnect, and everything
+        still queued is re-read by the catch-up after reconnecting.
+        """
+        senders = [asyncio.ensure_future(self.send_history(route)) for route in self.routes if route.error is None]
+        tasks = senders + [reader]
+        try:
+            if live:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            else:
+                await asyncio.gather(*senders)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report_throughput(self, started):
+        """Log messages/second and requests/message per destination for the finished copy"""
+        elapsed = max(time.monotonic() - started, 0.001)
+        for route in self.routes:
+            rate = route.messages_processed / elapsed
+            per_message = route.requests_made / route.messages_processed if route.messages_processed else 0
+            limiter = route.rate_limiter.metrics()
+            self.on_message(
+                f"📊 {route.name}: {route.messages_processed} messages in {elapsed:.1f}s "
+                f"({rate:.1f} msg/s, {per_message:.2f} requests/message)"
+            )
+            self.on_message(
+                f"📊 {route.name}: send rate {limiter['rate']:.1f} req/s, {limiter['flood_waits']} flood waits, "
+                f"{limiter['total_wait_seconds']:.1f}s spent waiting"
+            )
+            if route.duplicates_skipped:
+                self.on_message(
+                    f"📊 {route.name}: {route.duplicates_skipped} duplicate sends skipped, "
+                    f"{format_bytes(route.bytes_saved)} saved"
+                )
+        if self.account_pool and len(self.account_pool) > 1:
+            for account in self.account_pool.accounts:
+                self.on_message(
+                    f"📊 account {account.phone}: {account.messages_sent} messages in {account.requests} requests, "
+                    f"{account.flood_waits} flood waits, {account.state()}"
+                )
+
+    def open_stores(self, checkpoints=True):
+        """Open the checkpoint and dedup stores on the thread that uses them"""
+        if checkpoints:
+            self.checkpoints = CheckpointStore()
+        if self.dedup:
+            self.dedup_index = DedupIndex()
+
+    def close_stores(self):
+        for store in (self.checkpoints, self.dedup_index):
+            if store:
+                store.close()
+        self.checkpoints = None
+        self.dedup_index = None
+
+    async def forward_existing_messages(self):
+        try:
+            self.on_message("📥 Starting to copy messages...")
+
+            self.open_stores()
+            for route in self.routes:
+                checkpoint = self.checkpoints.load(self.source_id, route.dest_id, self.filters,
+                                                   (self.min_id, self.max_id))
+                high_water = 0
+                if self.incremental:
+                    high_water = self.checkpoints.load_high_water(self.source_id, route.dest_id, self.filters)
+                route.start_id = max(checkpoint, high_water, self.min_id)
+                route.handled_id = route.start_id
+                route.queue = asyncio.Queue(maxsize=self.queue_size)
+                if checkpoint and checkpoint >= high_water:
+                    self.on_message(
+                        f"↩️ {route.name}: resuming after message #{checkpoint} from the last run"
+                    )
+                elif high_water > self.min_id:
+                    self.on_message(f"⏩ {route.name}: copying only messages after #{high_water} from the last run")
+
+            # Only the newest message is fetched, for its ID and the total count
+            history = await self.client.get_messages(self.source_id, limit=1)
+            total_messages = getattr(history, 'total', 0) or 0
+            self.top_id = history[0].id if history else 0
+            if self.max_id:
+                self.top_id = min(self.top_id, self.max_id - 1)
+            self.on_message(
+                f"Found {total_messages} messages in source, copying to {len(self.routes)} "
+                f"destination(s) as they are read..."
+            )
+            if self.query_plan.queries != [{}]:
+                self.on_message(f"🔎 Asking Telegram only for: {self.query_plan.describe()}")
+
+            started = time.monotonic()
+            await self.run_senders(asyncio.ensure_future(self.read_history()))
+
+            self.report_throughput(started)
+            if self.is_running and self.history_exhausted:
+                # The whole history is copied, a new run starts from scratch,
+                # or after this copy's end when it is incremental. A copy
+                # that started at min_id left a gap an incremental run
+                # must not skip over, unless it was incremental itself. A
+                # copy that stopped at max_id says nothing about what came
+                # after it, so it leaves the mark alone.
+                # A destination that stopped early or where messages failed keeps its
+                # checkpoint and gets no high water mark, so nothing is taken as covered
+                high_water = max(self.top_id, self.last_read_id)
+                for route in self.routes:
+                    if route.error is not None or route.messages_failed:
+                        continue
+                    self.checkpoints.clear(self.source_id, route.dest_id, self.filters, (self.min_id, self.max_id))
+                    if not self.max_id and (self.incremental or not self.min_id):
+                        self.checkpoints.save_high_water(self.source_id, route.dest_id, self.filters,
+                                                         max(high_water, route.handled_id))
+                    route.complete = True
+                # Reconnects in live mode must not copy the history again
+                self.forward_existing = False
+                self.metrics.publish()
+                if all(route.complete for route in self.routes):
+                    self.on_message("✨ Finished copying messages!")
+                else:
+                    self.on_message("⚠️ Finished copying messages with errors, those destinations keep their progress")
+            elif any(route.handled_id for route in self.routes):
+                self.on_message("💾 Progress saved, starting again will resume where this run stopped")
+
+        except Exception as e:
+            self.on_error(f"Error copying messages: {str(e)}")
+        finally:
+            self.close_stores()
+
+    async def queue_live_messages(self, messages):
+        """Run new source messages through the filters and albums grouping"""
+        messages = [message for message in messages if message.id > self.last_read_id]
+        if not messages:
+            return
+
+        async def source():
+            for message in messages:
+                yield message
+
+        async for unit in self.iter_units(source()):
+            await self.fan_out(unit)
+
+    async def on_new_message(self, event):
+        if event.message.grouped_id:
+            # Albums arrive as a whole through on_album
+            return
+        await self.on_live_messages([event.message])
+
+    async def on_album(self, event):
+        await self.on_live_messages(event.messages)
+
+    async def on_live_messages(self, messages):
+        if self.live_backlog is None and (self.paused or any(route.queue.full() for route in self.routes)):
+            # Don't hold up the client's update handling, which every job on the account shares, while
+            # the senders wait; a destination in a flood wait fills its queue
+            self.live_backlog = []
+        if self.live_backlog is not None:
+            # Still catching up, paused or a queue is full, keep the order by sending these afterwards
+            self.live_backlog.append(messages)
+            return
+        # An update is one message or album, so one unit: it fits without waiting in the queues that aren't full
+        await self.queue_live_messages(messages)
+
+    async def drain_live_backlog(self):
+        """Queue the posts that arrived while catching up, paused or held up, then let new ones through directly"""
+        while self.live_backlog:
+            await self.queue_live_messages(self.live_backlog.pop(0))
+        self.live_backlog = None
+
+    async def watch_live(self):
+        """Catch up on missed posts, then idle while the event handlers queue new ones"""
+        # Pick up anything posted between the history copy (or the last
+        # connection) and the handlers being registered, starting after the
+        # last message the slowest destination received
+        handled = [route.handled_id for route in self.routes if route.error is None]
+        if all(handled):
+            self.last_read_id = min(handled)
+        for route in self.routes:
+            route.start_id = max(route.start_id, route.handled_id)
+        if self.last_read_id:
+            async for unit in self.iter_history(self.last_read_id):
+                await self.fan_out(unit)
+        await self.drain_live_backlog()
+
+        self.on_message("📡 Live mode: watching the source for new messages...")
+        while self.is_running and self.client.is_connected():
+            if self.live_backlog and not self.paused:
+                await self.drain_live_backlog()
+            await asyncio.sleep(0.5)
+
+    async def forward_live_messages(self):
+        """Forward new source messages as they are posted until stopped or disconnected"""
+        self.live_backlog = []
+        for route in self.routes:
+            route.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.open_stores(checkpoints=self.checkpoint_live)
+        message_filter = events.NewMessage(chats=self.source_id)
+        album_filter = events.Album(chats=self.source_id)
+        self.client.add_event_handler(self.on_new_message, message_filter)
+        self.client.add_event_handler(self.on_album, album_filter)
+        try:
+            await self.run_senders(asyncio.ensure_future(self.watch_live()), live=True)
+        finally:
+            self.client.remove_event_handler(self.on_new_message, message_filter)
+            self.client.remove_event_handler(self.on_album, album_filter)
+            self.live_backlog = None
+            self.close_stores()
+
+        if self.is_running:
+            raise ConnectionError("Disconnected from Telegram")
+
+    async def forward_messages(self):
+        while self.is_running:
+            try:
+                if not await self.connect_client():
+                    if self.retry_count >= self.max_retries:
+                        self.on_error("Max reconnection attempts reached. Please restart the application.")
+                        break
+                    self.retry_count += 1
+                    self.reconnects += 1
+                    self.on_message(f"Reconnecting... Attempt {self.retry_count}/{self.max_retries}")
+                    await asyncio.sleep(self.reconnect_interval)
+                    continue
+
+                self.retry_count = 0
+
+                try:
+                    source_entity = await self.client.get_entity(self.source_id)
+                    source_name = getattr(source_entity, 'title', None) or getattr(source_entity, 'first_name', 'Unknown') or str(self.source_id)
+                    self.source_peer = await self.client.get_input_entity(source_entity)
+                    self.on_message(f"Connected to source: {source_name}")
+
+                    for route in self.routes:
+                        dest_entity = await self.client.get_entity(route.dest_id)
+                        route.name = getattr(dest_entity, 'title', None) or getattr(dest_entity, 'first_name', 'Unknown') or str(route.dest_id)
+                        route.peer = await self.client.get_input_entity(dest_entity)
+                        self.on_message(f"Connected to destination: {route.name}")
+                    await self.connect_send_accounts()
+
+                    if self.forward_existing:
+                        await self.forward_existing_messages()
+
+                    if not self.live:
+                        self.is_running = False
+                        break
+
+                    await self.forward_live_messages()
+
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    self.on_error(f"Error validating chat IDs: {str(e)}")
+                    continue
+
+            except ConnectionError:
+                if self.is_running:
+                    self.reconnects += 1
+                    self.on_message("📡 Connection lost. Attempting to reconnect...")
+                    continue
+            except Exception as e:
+                self.on_error(f"Error in forward_messages: {str(e)}")
+                if self.is_running:
+                    await asyncio.sleep(self.reconnect_interval)
+                    continue
+
+    async def forward_with_metrics(self):
+        """forward_messages, publishing a metrics snapshot every interval while it runs"""
+        if self.trace_file:
+            self.tracer = Tracer(f"{self.source_id} → {', '.join(str(dest_id) for dest_id in self.dest_ids)}")
+        reporter = asyncio.ensure_future(self.metrics.run())
+        try:
+            await self.forward_messages()
+        finally:
+            reporter.cancel()
+            self.metrics.publish()
+            self.report_trace()
+
+    def report_trace(self):
+        """Log the time spent per stage and write the Chrome trace"""
+        if not self.tracer.enabled:
+            return
+        for line in self.tracer.format_summary():
+            self.on_message(line)
+        try:
+            self.tracer.export(self.trace_file)
+            self.on_message(f"🧭 Trace saved to {self.trace_file} (open it in chrome://tracing or ui.perfetto.dev)")
+        except Exception as e:
+            self.on_error(f"Error saving the trace: {str(e)}")
+
+    def run(self):
+        """Run the job on the client loop and block until it ends"""
+        # The shared client stays connected for the next job
+        self.client_manager.run(self.forward_with_metrics())
+
+    def stop(self):
+        self.is_running = False
+
+    def pause(self):
+        """Hold this job's sends until resume(); reading stops once the queues are full"""
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def weight(self):
+        """Share of the account's send budget: live forwarding goes ahead of history backfills"""
+        if self.priority == 'high' or (self.priority is None and self.live and not self.forward_existing):
+            return LIVE_WEIGHT
+        return BULK_WEIGHT
@@ -0,0 +1,350 @@
+"""Message filter rules: a small declarative language compiled once into a predicate.
+
+Rules are a JSON object, for example:
+
+    {
+        "types": ["photo", "video"],
+        "keywords": ["release", "changelog"],
+        "exclude_keywords": ["#ad"],
+        "regex": "v\\d+\\.\\d+",
+        "mime": ["video/*"],
+        "min_size": 1048576,
+        "after": "2024-01-01",
+        "before": "2024-07-01",
+        "senders": [123456789],
+        "min_views": 100,
+        "has_link": false
+    }
+
+Every rule that is set must match. "types" picks among text, photo,
+video and document, where text means a message without a photo or file;
+the GUI's text/media/documents checkboxes are accepted as well. Text
+rules look at the message text or media caption, mime and size rules only
+at photos and files (photos count as image/jpeg). Keywords match the start
+of a word, case-insensitively, as Telegram's search does: "post" matches
+"Posted" but not "repost"; "new release" matches those words in a row.
+
+QueryPlan turns the rules into iter_messages queries so Telegram only
+returns candidates: types become InputMessagesFilter* (one query per
+filter, merged by message ID), keywords become server searches, has_link
+the URL filter, "after" the start date and "before" the point where
+reading stops. A server search returns every message the keyword matches
+locally, so history copies and live forwarding pick the same messages.
+Files the server doesn't list under a media tab (stickers, for example)
+are not found by type queries.
+"""
+import fnmatch
+import heapq
+import json
+import re
+from datetime import datetime, timezone
+from telethon import types
+
+MESSAGE_TYPES = ('text', 'photo', 'video', 'document')
+TYPE_NAMES = {'text': "Text", 'photo': "Photo", 'video': "Video", 'document': "Document"}
+RULE_KEYS = {
+    'types', 'text', 'media', 'documents', 'keywords', 'exclude_keywords', 'regex', 'exclude_regex',
+    'mime', 'min_size', 'max_size', 'after', 'before', 'senders', 'min_views', 'max_views', 'has_link'
+}
+LINK_PATTERN = re.compile(r'https?://|\bt\.me/|\bwww\.', re.IGNORECASE)
+LINK_ENTITIES = (types.MessageEntityUrl, types.MessageEntityTextUrl)
+# The shared media tabs holding each message type; photo and video together are one tab.
+# Videos sent as files are only listed under documents, the local type check sorts those out
+TYPE_QUERIES = {
+    'photo': (types.InputMessagesFilterPhotos,),
+    'video': (types.InputMessagesFilterVideo, types.InputMessagesFilterGif, types.InputMessagesFilterRoundVideo,
+              types.InputMessagesFilterDocument),
+    'document': (types.InputMessagesFilterDocument, types.InputMessagesFilterMusic, types.InputMessagesFilterVoice),
+}
+# Type filters that return exactly the messages MessageFilter types that way
+EXACT_QUERIES = {frozenset(['photo']): types.InputMessagesFilterPhotos}
+# Above this many queries the keyword searches are left to the local check
+MAX_QUERIES = 8
+
+def load_rules(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+def parse_date(value, key):
+    try:
+        date = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"'{key}' must be an ISO date like 2024-01-31, got {value!r}")
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+def number_rule(rules, key):
+    value = rules.get(key)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise ValueError(f"'{key}' must be a number, got {value!r}")
+    return value
+
+def compile_pattern(patterns, key):
+    """One case-insensitive regex matching any of the patterns"""
+    try:
+        return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Invalid '{key}' pattern: {str(e)}")
+
+def compile_keywords(keywords):
+    """One case-insensitive regex matching any of the keywords at the start of a word"""
+    if not keywords:
+        return None
+    patterns = (r'\s+'.join(re.escape(word) for word in keyword.split()) for keyword in keywords)
+    return re.compile('|'.join(r'(?<!\w)' + pattern for pattern in patterns), re.IGNORECASE)
+
+def rule_types(rules):
+    if 'types' in rules:
+        selected = set(as_list(rules['types']))
+        unknown = selected - set(MESSAGE_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown message type(s): {', '.join(sorted(unknown))}")
+        return selected
+    # The GUI checkboxes: media covers photos and videos, documents everything else
+    selected = set()
+    if rules.get('text', True):
+        selected.add('text')
+    if rules.get('media', True):
+        selected.update(('photo', 'video'))
+    if rules.get('documents', True):
+        selected.add('document')
+    return selected
+
+class MessageFilter:
+    """Compiled filter rules; calling it returns the message type name, or None to skip the message
+
+    Cheap checks (type, sender, date, views) run before text and regex
+    checks, and the media kind is looked up once per media class.
+    """
+
+    def __init__(self, rules=None):
+        rules = dict(rules or {})
+        unknown = set(rules) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"Unknown filter rule(s): {', '.join(sorted(unknown))}")
+        self.rules = rules
+        self.types = rule_types(rules)
+
+        self.keywords = [str(keyword).lower() for keyword in as_list(rules.get('keywords')) if str(keyword).strip()]
+        self.exclude_keywords = [str(keyword).lower() for keyword in as_list(rules.get('exclude_keywords'))
+                                 if str(keyword).strip()]
+        self.keyword_pattern = compile_keywords(self.keywords)
+        self.exclude_keyword_pattern = compile_keywords(self.exclude_keywords)
+        self.regex = compile_pattern(as_list(rules['regex']), 'regex') if rules.get('regex') else None
+        self.exclude_regex = (compile_pattern(as_list(rules['exclude_regex']), 'exclude_regex')
+                              if rules.get('exclude_regex') else None)
+        self.mime = (compile_pattern([fnmatch.translate(glob) for glob in as_list(rules['mime'])], 'mime')
+                     if rules.get('mime') else None)
+        self.min_size = number_rule(rules, 'min_size')
+        self.max_size = number_rule(rules, 'max_size')
+        self.after = parse_date(rules['after'], 'after') if rules.get('after') else None
+        self.before = parse_date(rules['before'], 'before') if rules.get('before') else None
+        senders = as_list(rules.get('senders'))
+        for sender in senders:
+            if isinstance(sender, bool) or not isinstance(sender, int):
+                raise ValueError(f"'senders' must be user IDs, got {sender!r}")
+        self.senders = set(senders) or None
+        self.min_views = number_rule(rules, 'min_views')
+        self.max_views = number_rule(rules, 'max_views')
+        self.has_link = rules.get('has_link')
+        if self.has_link is not None and not isinstance(self.has_link, bool):
+            raise ValueError(f"'has_link' must be true or false, got {self.has_link!r}")
+        self.media_kinds = {}
+
+        checks = []
+        if self.senders is not None:
+            checks.append(lambda message: getattr(message, 'sender_id', None) in self.senders)
+        if self.after is not None:
+            checks.append(lambda message: message.date is not None and message.date >= self.after)
+        if self.before is not None:
+            checks.append(lambda message: message.date is not None and message.date < self.before)
+        if self.min_views is not None:
+            checks.append(lambda message: (getattr(message, 'views', None) or 0) >= self.min_views)
+        if self.max_views is not None:
+            checks.append(lambda message: (getattr(message, 'views', None) or 0) <= self.max_views)
+        if self.min_size is not None or self.max_size is not None:
+            checks.append(self.check_size)
+        if self.keywords or self.exclude_keywords:
+            checks.append(self.check_keywords)
+        if self.regex is not None:
+            checks.append(lambda message: self.regex.search(message.message or '') is not None)
+        if self.exclude_regex is not None:
+            checks.append(lambda message: self.exclude_regex.search(message.message or '') is None)
+        if self.has_link is not None:
+            checks.append(lambda message: self.message_has_link(message) == bool(self.has_link))
+        self.checks = checks
+
+    def without(self, keys):
+        """A filter for the rules left after the checks in keys were done elsewhere"""
+        keys = set(keys)
+        if 'types' in keys:
+            # Dropping the type check has to drop the GUI's type checkboxes too
+            keys.update(('text', 'media', 'documents'))
+        return MessageFilter({key: value for key, value in self.rules.items() if key not in keys})
+
+    def __call__(self, message):
+        message_type = self.message_type(message)
+        if message_type is None:
+            return None
+        for check in self.checks:
+            if not check(message):
+                return None
+        return TYPE_NAMES[message_type]
+
+    def media_kind(self, media):
+        """'photo', 'document' or None, decided once per media class"""
+        media_class = type(media)
+        kind = self.media_kinds.get(media_class, False)
+        if kind is False:
+            kind = 'photo' if hasattr(media, 'photo') else 'document' if hasattr(media, 'document') else None
+            self.media_kinds[media_class] = kind
+        return kind
+
+    def message_type(self, message):
+        """'photo', 'video' or 'document' by the message's file, 'text' without one"""
+        media = message.media
+        kind = self.media_kind(media) if media else None
+        if kind is None:
+            return 'text' if message.message and 'text' in self.types else None
+        if kind == 'photo':
+            if self.mime is not None and not self.mime.match('image/jpeg'):
+                return None
+            return 'photo' if 'photo' in self.types else None
+        mime_type = getattr(media.document, 'mime_type', None) or ''
+        if self.mime is not None and not self.mime.match(mime_type):
+            return None
+        message_type = 'video' if mime_type.startswith('video/') else 'document'
+        return message_type if message_type in self.types else None
+
+    def check_size(self, message):
+        media = message.media
+        kind = self.media_kind(media) if media else None
+        if kind == 'document':
+            size = getattr(media.document, 'size', 0) or 0
+        elif kind == 'photo':
+            size = max((getattr(size, 'size', 0) or max(getattr(size, 'sizes', None) or [0])
+                        for size in getattr(media.photo, 'sizes', None) or []), default=0)
+        else:
+            return True
+        if self.min_size is not None and size < self.min_size:
+            return False
+        return self.max_size is None or size <= self.max_size
+
+    def check_keywords(self, message):
+        text = message.message or ''
+        if self.keyword_pattern is not None and self.keyword_pattern.search(text) is None:
+            return False
+        return self.exclude_keyword_pattern is None or self.exclude_keyword_pattern.search(text) is None
+
+    def message_has_link(self, message):
+        if any(isinstance(entity, LINK_ENTITIES) for entity in getattr(message, 'entities', None) or []):
+            return True
+        return LINK_PATTERN.search(message.message or '') is not None
+
+class QueryPlan:
+    """The iter_messages queries for a MessageFilter, and the checks still left to do locally
+
+    queries are keyword arguments for iter_messages, residual is the
+    MessageFilter to run on what they return.
+    """
+
+    def __init__(self, message_filter):
+        self.message_filter = message_filter
+        pushed = set()
+
+        type_filters = [None]
+        if 'text' not in message_filter.types:
+            selected = frozenset(message_filter.types)
+            if selected in EXACT_QUERIES:
+                type_filters = [EXACT_QUERIES[selected]]
+                pushed.add('types')
+            else:
+                queries = []
+                for message_type in MESSAGE_TYPES[1:]:
+                    if message_type in selected:
+                        queries.extend(TYPE_QUERIES[message_type])
+                if {'photo', 'video'} <= selected:
+                    # One tab covers both
+                    queries.remove(types.InputMessagesFilterPhotos)
+                    queries[queries.index(types.InputMessagesFilterVideo)] = types.InputMessagesFilterPhotoVideo
+                type_filters = list(dict.fromkeys(queries))
+        elif message_filter.has_link:
+            # Text messages can't be asked for, but linked ones can
+            type_filters = [types.InputMessagesFilterUrl]
+
+        searches = [None]
+        if message_filter.keywords and len(message_filter.keywords) * len(type_filters) <= MAX_QUERIES:
+            searches = message_filter.keywords
+
+        self.queries = []
+        for type_filter in type_filters:
+            for search in searches:
+                query = {}
+                if type_filter is not None:
+                    query['filter'] = type_filter
+                if search is not None:
+                    query['search'] = search
+                self.queries.append(query)
+
+        self.after = message_filter.after
+        # Reading oldest-first, the first message at or past "before" ends the read
+        self.before = message_filter.before
+        if self.before is not None:
+            pushed.add('before')
+        self.residual = message_filter.without(pushed) if pushed else message_filter
+
+    def describe(self):
+        names = []
+        for query in self.queries:
+            parts = []
+            if 'filter' in query:
+                parts.append(query['filter'].__name__.replace('InputMessagesFilter', ''))
+            if 'search' in query:
+                parts.append(f'"{query["search"]}"')
+            names.append(' '.join(parts) or 'everything')
+        return ', '.join(names)
+
+    async def iter_messages(self, client, chat, min_id=0, max_id=0):
+        """Oldest-first messages of chat matching the server-side part of the plan"""
+        kwargs = {'limit': None, 'reverse': True, 'min_id': min_id, 'max_id': max_id}
+        if self.after is not None and not min_id:
+            # offset_id wins over offset_date, so the date only helps a fresh start
+            kwargs['offset_date'] = self.after
+        streams = [client.iter_messages(chat, **kwargs, **query) for query in self.queries]
+        if not streams:
+            return
+        messages = streams[0] if len(streams) == 1 else merge_by_id(streams)
+        async for message in messages:
+            if self.before is not None and message.date is not None and message.date >= self.before:
+                break
+            yield message
+
+async def next_message(stream):
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def merge_by_id(streams):
+    """Merge oldest-first message streams into one, yielding each message ID once"""
+    heap = []
+    for index, stream in enumerate(streams):
+        message = await next_message(stream)
+        if message is not None:
+            heap.append((message.id, index, message))
+    heapq.heapify(heap)
+    last_id = None
+    while heap:
+        message_id, index, message = heap[0]
+        if message_id != last_id:
+            last_id = message_id
+            yield message
+        following = await next_message(streams[index])
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following.id, index, following))
@@ -0,0 +1,199 @@
+"""Prometheus metrics of the forwarding jobs, served on a local HTTP port.
+
+MetricsServer reads the counters the jobs already keep for their 📊 log
+lines and the GUI's progress (messages read, filtered, forwarded, failed
+and skipped, bytes, flood waits, requests, queue depth, reconnects,
+errors, per-account sends) when it is scraped, so nothing is added per
+message. Send latency is the one figure recorded as it happens, into a
+Histogram per route and account.
+
+    server = MetricsServer(port=9464)
+    server.add_scheduler(scheduler)
+    server.start()
+    # curl http://127.0.0.1:9464/metrics
+
+Routes are labelled by source and destination chat ID, accounts by
+phone. Finished jobs stay in the totals, so counters never go back.
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; sends take tens to hundreds of milliseconds, album uploads longer
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Histogram:
+    """Counts of observations per bucket, with their sum"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # The last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+def format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+class Collection:
+    """Metric families being gathered for one scrape; samples with the same labels add up"""
+
+    def __init__(self):
+        self.families = {}
+
+    def family(self, name, kind, help_text):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (kind, help_text, {})
+        return family[2]
+
+    def add(self, name, kind, help_text, labels, value):
+        samples = self.family(name, kind, help_text)
+        key = tuple(labels.items())
+        samples[key] = samples.get(key, 0) + value
+
+    def add_histogram(self, name, help_text, labels, histogram):
+        samples = self.family(name, 'histogram', help_text)
+        key = tuple(labels.items())
+        counts = list(histogram.counts)
+        total = samples.get(key)
+        if total is None:
+            samples[key] = (counts, histogram.sum, histogram.buckets)
+        else:
+            samples[key] = ([a + b for a, b in zip(total[0], counts)], total[1] + histogram.sum, total[2])
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, samples) in self.families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples.items():
+                if kind != 'histogram':
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                    continue
+                counts, total, buckets = value
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+def collect_job(collection, job):
+    source = {'source': job.source_id}
+    collection.add('forwarder_messages_read_total', 'counter',
+                   "Source messages read, after any server-side filtering", source, job.messages_scanned)
+    collection.add('forwarder_messages_filtered_total', 'counter',
+                   "Messages read that the filter rules skipped", source, job.messages_filtered)
+    collection.add('forwarder_reconnects_total', 'counter', "Reconnections to Telegram", source, job.reconnects)
+    collection.add('forwarder_errors_total', 'counter', "Errors reported to the log", source, job.errors_reported)
+
+    for route in job.routes:
+        labels = {'source': job.source_id, 'destination': route.dest_id}
+        collection.add('forwarder_messages_forwarded_total', 'counter',
+                       "Messages copied or forwarded to the destination", labels, route.messages_processed)
+        collection.add('forwarder_messages_failed_total', 'counter',
+                       "Messages that could not be sent", labels, route.messages_failed)
+        collection.add('forwarder_duplicates_skipped_total', 'counter',
+                       "Messages skipped as already sent to the destination", labels, route.duplicates_skipped)
+        collection.add('forwarder_bytes_sent_total', 'counter', "Bytes of media sent", labels, route.bytes_sent)
+        collection.add('forwarder_requests_total', 'counter', "Send requests made", labels, route.requests_made)
+        collection.add('forwarder_flood_wait_seconds_total', 'counter',
+                       "Seconds of flood waits Telegram asked for", labels, route.flood_wait_seconds)
+        queue = route.queue
+        collection.add('forwarder_queue_depth', 'gauge', "Units read and waiting to be sent", labels,
+                       queue.qsize() if queue is not None else 0)
+        for phone, histogram in list(route.send_latency.items()):
+            collection.add_histogram('forwarder_send_latency_seconds', "Duration of send requests",
+                                     {**labels, 'account': phone}, histogram)
+
+    pool = job.account_pool
+    for account in (pool.accounts if pool is not None else []):
+        labels = {'account': account.phone}
+        collection.add('forwarder_account_requests_total', 'counter', "Send requests made by the account",
+                       labels, account.requests)
+        collection.add('forwarder_account_messages_sent_total', 'counter', "Messages sent by the account",
+                       labels, account.messages_sent)
+        collection.add('forwarder_account_flood_waits_total', 'counter', "Flood waits the account got",
+                       labels, account.flood_waits)
+        collection.add('forwarder_account_flood_wait_seconds_total', 'counter',
+                       "Seconds of flood waits the account got", labels, account.flood_wait_seconds)
+
+def collect_states(collection, scheduler):
+    states = {}
+    for job_id in list(scheduler.jobs):
+        state = scheduler.state(job_id)
+        states[state] = states.get(state, 0) + 1
+    for state in ('copying', 'live', 'paused', 'done', 'cancelled'):
+        collection.add('forwarder_jobs', 'gauge', "Jobs by state", {'state': state}, states.get(state, 0))
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        try:
+            body = self.server.metrics.render().encode('utf-8')
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the log
+        pass
+
+class MetricsServer:
+    """Serves the metrics of every job a JobScheduler ran, in the Prometheus text format"""
+
+    def __init__(self, host='127.0.0.1', port=9464):
+        self.host = host
+        self.port = port
+        self.schedulers = []
+        self.httpd = None
+
+    def add_scheduler(self, scheduler):
+        self.schedulers.append(scheduler)
+
+    def render(self):
+        collection = Collection()
+        for scheduler in list(self.schedulers):
+            collect_states(collection, scheduler)
+            for job in list(scheduler.jobs.values()):
+                collect_job(collection, job)
+        return collection.render()
+
+    def start(self):
+        """Listen in a background thread; raises OSError if the port is taken"""
+        self.httpd = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.metrics = self
+        # Port 0 picks a free one
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True).start()
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1,219 @@
+"""Per-stage timing of a forwarding job, exported as a Chrome trace.
+
+A Tracer records spans for the stages of a copy: fetching history pages,
+evaluating filters, waiting for the rate limiter or a flood wait,
+downloading and uploading media and sending. Spans are laid out one lane
+per asyncio task, packed into rows when tasks don't overlap; the exported
+JSON opens in chrome://tracing or https://ui.perfetto.dev. summary()
+totals the time per stage.
+
+Filter checks and the messages served from an already fetched page are
+too many to record one by one, so they only add to their stage's total.
+
+NULL_TRACER stands in when tracing is off. Its methods record nothing
+and hand back the iterator or function they are given, so a job that
+isn't traced runs the same code as before.
+"""
+import asyncio
+import json
+import time
+import weakref
+from contextlib import nullcontext
+
+# Time on the message iterator above this means a page was requested, below it the page was buffered
+PAGE_THRESHOLD = 0.001
+
+class StageStats:
+    __slots__ = ('count', 'total', 'longest')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+
+class Tracer:
+    """Records the spans of one job"""
+
+    enabled = True
+
+    def __init__(self, name='forwarding job'):
+        self.name = name
+        self.started = time.perf_counter()
+        self.events = []
+        self.stats = {}
+        # Lane numbers by asyncio task and by explicit lane name, and the name of each lane's group.
+        # Weak keys, as a finished task's id() can come back for a new one.
+        self.task_lanes = weakref.WeakKeyDictionary()
+        self.named_lanes = {}
+        self.lane_groups = {}
+
+    def lane(self, stage, name=None):
+        if name is None:
+            try:
+                lanes, key = self.task_lanes, asyncio.current_task()
+            except RuntimeError:
+                lanes, key = self.named_lanes, 'main'
+        else:
+            lanes, key = self.named_lanes, name
+        lane = lanes.get(key)
+        if lane is None:
+            lane = lanes[key] = len(self.lane_groups) + 1
+            # Task lanes are grouped by the stage they started with
+            self.lane_groups[lane] = (name or stage, name is not None)
+        return lane
+
+    def count(self, stage, duration, calls=1):
+        """Add to a stage's totals without recording a span"""
+        stats = self.stats.get(stage)
+        if stats is None:
+            stats = self.stats[stage] = StageStats()
+        stats.count += calls
+        stats.total += duration
+        if calls and duration > stats.longest:
+            stats.longest = duration
+
+    def add(self, stage, started, duration, lane=None, **args):
+        """Record a span that began at perf_counter() time started
+
+        lane puts it on a named lane instead of the current task's, for
+        spans that overlap the task's own, such as a flood wait.
+        """
+        self.count(stage, duration)
+        self.events.append((stage, started, duration, self.lane(stage, lane), args))
+
+    def span(self, stage, **args):
+        """Context manager recording the time spent inside it"""
+        return Span(self, stage, args)
+
+    async def iter_pages(self, stage, messages):
+        """Pass messages through, recording each page request as a span"""
+        while True:
+            started = time.perf_counter()
+            try:
+                message = await messages.__anext__()
+            except StopAsyncIteration:
+                return
+            duration = time.perf_counter() - started
+            if duration >= PAGE_THRESHOLD:
+                self.add(stage, started, duration)
+            else:
+                self.count(stage, duration, calls=0)
+            yield message
+
+    def timed(self, stage, function):
+        """function, adding the time of every call to the stage's total"""
+        def timed_function(*args):
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.count(stage, time.perf_counter() - started)
+        return timed_function
+
+    def summary(self):
+        """(stage, count, total seconds, longest seconds) by total time, largest first"""
+        return sorted(((stage, stats.count, stats.total, stats.longest) for stage, stats in self.stats.items()),
+                      key=lambda row: row[2], reverse=True)
+
+    def format_summary(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        lines = []
+        for stage, count, total, longest in self.summary():
+            # Stages overlap across tasks, so shares can add up to more than 100%
+            line = f"⏱️ {stage}: {total:.2f}s ({total / elapsed:.0%} of {elapsed:.1f}s)"
+            if count:
+                line += f", {count} × avg {total / count * 1000:.1f} ms, max {longest * 1000:.1f} ms"
+            lines.append(line)
+        return lines
+
+    def rows(self):
+        """Row of every lane, and the row names
+
+        Tasks come and go (one per file transfer, for example), so task
+        lanes of a group whose spans don't overlap in time share a row.
+        """
+        extents = {}
+        for _, started, duration, lane, _ in self.events:
+            first, last = extents.get(lane, (started, started + duration))
+            extents[lane] = (min(first, started), max(last, started + duration))
+
+        rows = {}
+        names = {}
+        ends_by_group = {}
+        for lane in sorted(extents, key=lambda lane: extents[lane][0]):
+            first, last = extents[lane]
+            group, named = self.lane_groups[lane]
+            ends = ends_by_group.setdefault(group, [])
+            for index, (row, end) in enumerate(ends):
+                if end <= first:
+                    ends[index] = (row, last)
+                    break
+            else:
+                row = len(names) + 1
+                names[row] = group if named else f"{group} {len(ends) + 1}"
+                ends.append((row, last))
+            rows[lane] = row
+        return rows, names
+
+    def chrome_trace(self):
+        """The spans in the Trace Event Format read by chrome://tracing and Perfetto"""
+        rows, names = self.rows()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': self.name}}]
+        for row, name in names.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': row, 'args': {'name': name}})
+            events.append({'name': 'thread_sort_index', 'ph': 'M', 'pid': 1, 'tid': row, 'args': {'sort_index': row}})
+        for stage, started, duration, lane, args in self.events:
+            events.append({
+                'name': stage, 'cat': stage, 'ph': 'X', 'pid': 1, 'tid': rows[lane],
+                'ts': (started - self.started) * 1e6, 'dur': duration * 1e6, 'args': args
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+class Span:
+    __slots__ = ('tracer', 'stage', 'args', 'started')
+
+    def __init__(self, tracer, stage, args):
+        self.tracer = tracer
+        self.stage = stage
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add(self.stage, self.started, time.perf_counter() - self.started, **self.args)
+        return False
+
+class NullTracer:
+    """A Tracer that records nothing"""
+
+    enabled = False
+    span_context = nullcontext()
+
+    def count(self, stage, duration, calls=1):
+        pass
+
+    def add(self, stage, started, duration, lane=None, **args):
+        pass
+
+    def span(self, stage, **args):
+        return self.span_context
+
+    def iter_pages(self, stage, messages):
+        return messages
+
+    def timed(self, stage, function):
+        return function
+
+    def summary(self):
+        return []
+
+    def format_summary(self):
+        return []
+
+NULL_TRACER = NullTracer()
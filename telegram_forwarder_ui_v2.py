@@ -1,24 +1,106 @@
 import sys
 import json
-import asyncio
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                           QPushButton, QLabel, QLineEdit, QTextEdit, QComboBox,
+                           QPushButton, QLabel, QLineEdit, QPlainTextEdit, QComboBox,
                            QCheckBox, QMessageBox, QProgressBar, QTabWidget,
                            QScrollArea, QFrame, QStyleFactory, QDialog, QRadioButton,
-                           QFormLayout, QHBoxLayout, QAction)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QMetaType
+                           QFormLayout, QHBoxLayout, QAction, QListWidget, QListWidgetItem,
+                           QFileDialog, QDateEdit, QSpinBox, QTableWidget, QTableWidgetItem,
+                           QAbstractItemView, QHeaderView)
+from PyQt5.QtCore import (Qt, QObject, QThread, pyqtSignal, QTimer, QMetaType, QAbstractListModel,
+                          QModelIndex, QSortFilterProxyModel, QDate)
 from PyQt5.QtGui import QFont, QIcon
-from telethon.sync import TelegramClient
-from telethon import errors, events, types
 import os
-import time
+# forwarder_engine, forwarder_filters and forwarder_metrics load Telethon and http.server, most of the
+# startup time; they are imported where used, once the window is on screen
 
 # Fix for PyQt5 deprecation warnings
 import sip
 sip.setapi('QVariant', 2)
 sip.setapi('QString', 2)
 
+# Applied once, to the whole application
+STYLESHEET = """
+    * {
+        font-family: 'Segoe UI', Arial, sans-serif;
+    }
+    QMainWindow {
+        background-color: #ffffff;
+    }
+    QLabel {
+        color: #2c3e50;
+        font-size: 12px;
+        font-weight: bold;
+    }
+    QPushButton {
+        background-color: #3498db;
+        color: white;
+        border: none;
+        padding: 10px;
+        border-radius: 5px;
+        font-weight: bold;
+        min-height: 35px;
+    }
+    QPushButton:hover {
+        background-color: #2980b9;
+    }
+    QPushButton:disabled {
+        background-color: #bdc3c7;
+    }
+    QLineEdit, QComboBox {
+        padding: 8px;
+        border: 2px solid #bdc3c7;
+        border-radius: 5px;
+        min-height: 30px;
+    }
+    QLineEdit:focus, QComboBox:focus {
+        border: 2px solid #3498db;
+    }
+    QPlainTextEdit {
+        border: 2px solid #bdc3c7;
+        border-radius: 5px;
+        padding: 5px;
+    }
+    QFrame {
+        border-radius: 5px;
+    }
+    QTabWidget::pane {
+        border: none;
+    }
+    QTabWidget::tab-bar {
+        alignment: center;
+    }
+    QTabBar::tab {
+        background-color: #f0f0f0;
+        color: #2c3e50;
+        padding: 10px 20px;
+        border-top-left-radius: 5px;
+        border-top-right-radius: 5px;
+    }
+    QTabBar::tab:selected {
+        background-color: #3498db;
+        color: white;
+    }
+    QCheckBox {
+        spacing: 10px;
+    }
+    QCheckBox::indicator {
+        width: 18px;
+        height: 18px;
+    }
+    QStatusBar {
+        background-color: #f8f9fa;
+        color: #2c3e50;
+    }
+"""
+# Status panel buttons, active and inactive
+STATUS_STYLES = {
+    True: "QPushButton { background-color: #2ecc71; padding: 8px 15px; text-align: left; }",
+    False: "QPushButton { background-color: #e74c3c; padding: 8px 15px; text-align: left; }",
+}
+
 class OTPDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -212,301 +294,217 @@ class LoadingDialog(QDialog):
         self.animation_timer.stop()
         super().closeEvent(event)
 
+class LogView(QPlainTextEdit):
+    """Read-only log that keeps the last max_lines lines and repaints at most flush_interval ms apart"""
+
+    def __init__(self, max_lines=5000, flush_interval=100, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        # Lines waiting for the next flush; a burst bigger than the cap only keeps its tail
+        self.pending = deque(maxlen=max_lines)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_interval)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def append_line(self, line):
+        self.pending.append(line)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # One append (and one relayout) for everything that arrived since the last flush
+        self.appendPlainText('\n'.join(self.pending))
+        self.pending.clear()
+
+CHAT_ICONS = {"Private": "👤", "Group": "👥", "Channel": "📢"}
+
+class ChatListModel(QAbstractListModel):
+    """All loaded chats, with display text and search keys computed once per load"""
+
+    TypeRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.chats = []
+        self.display = []
+        self.search_keys = []
+        # Row numbers per chat type, and row per chat ID
+        self.buckets = {}
+        self.rows_by_id = {}
+
+    def set_chats(self, chats):
+        self.beginResetModel()
+        self.chats = []
+        self.display = []
+        self.search_keys = []
+        self.buckets = {}
+        self.rows_by_id = {}
+        self.index_chats(chats)
+        self.endResetModel()
+
+    def add_chats(self, chats):
+        """Append a page of chats without touching the rows already shown"""
+        if not chats:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.chats), len(self.chats) + len(chats) - 1)
+        self.index_chats(chats)
+        self.endInsertRows()
+
+    def index_chats(self, chats):
+        for chat in chats:
+            row = len(self.chats)
+            self.chats.append(chat)
+            icon = CHAT_ICONS.get(chat['type'])
+            text = f"{chat['title']} ({chat['type']})"
+            self.display.append(f"{icon} {text}" if icon else text)
+            self.search_keys.append(f"{chat['title']} {chat['id']}".lower())
+            self.buckets.setdefault(chat['type'], []).append(row)
+            self.rows_by_id[chat['id']] = row
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.chats)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.display[row]
+        if role == Qt.UserRole:
+            return self.chats[row]['id']
+        if role == self.TypeRole:
+            return self.chats[row]['type']
+        return None
+
+class ChatFilterProxy(QSortFilterProxyModel):
+    """Category and title/ID search over a ChatListModel
+
+    Matching rows are kept in a set; typing more characters only
+    rescans the rows that matched the shorter text.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.category = None
+        self.text = ''
+        self.matches = None
+        # Rows covered by matches; streamed pages are appended after it
+        self.rows_checked = 0
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.forget_matches)
+
+    def forget_matches(self):
+        self.matches = None
+
+    def set_category(self, category):
+        if category != self.category:
+            self.category = category
+            self.refilter(narrowing=False)
+
+    def set_text(self, text):
+        text = text.strip().lower()
+        if text != self.text:
+            narrowing = bool(self.text) and text.startswith(self.text)
+            self.text = text
+            self.refilter(narrowing)
+
+    def refilter(self, narrowing):
+        complete = self.matches is not None and self.rows_checked == len(self.sourceModel().chats)
+        self.matches = self.find_matches(self.matches if narrowing and complete else None)
+        self.invalidateFilter()
+
+    def find_matches(self, candidates=None):
+        model = self.sourceModel()
+        self.rows_checked = len(model.chats)
+        if candidates is None:
+            candidates = model.buckets.get(self.category, ()) if self.category else range(len(model.chats))
+        if not self.text:
+            return set(candidates)
+        keys = model.search_keys
+        return {row for row in candidates if self.text in keys[row]}
+
+    def accepts(self, row):
+        model = self.sourceModel()
+        if self.category and model.chats[row]['type'] != self.category:
+            return False
+        return self.text in model.search_keys[row]
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.matches is None:
+            self.matches = self.find_matches()
+        if source_row >= self.rows_checked:
+            return self.accepts(source_row)
+        return source_row in self.matches
+
 class ChatListThread(QThread):
     update_signal = pyqtSignal(list)
+    # Pages of chats while the list is first streamed in
+    page_signal = pyqtSignal(list)
     error_signal = pyqtSignal(str)
     code_request_signal = pyqtSignal()
     login_success_signal = pyqtSignal()
     status_signal = pyqtSignal(str)
     progress_signal = pyqtSignal(str)
 
-    def __init__(self, api_id, api_hash, phone, load_chats=False):
+    def __init__(self, client_manager, api_id, api_hash, phone, load_chats=False):
         super().__init__()
-        self.api_id = api_id
-        self.api_hash = api_hash
-        self.phone = phone
-        self.client = None
-        self.code = None
-        self.code_ready = asyncio.Event()
-        self.verification_timeout = 60
-        self.load_chats = load_chats
-
-    def set_verification_code(self, code):
-        """Set the verification code and signal that it's ready"""
-        self.code = code
-        self.code_ready.set()  # Signal that the code is ready
-
-    async def initialize_client(self):
-        """Initialize client with better connection settings"""
-        session_name = f'session_{self.phone}'
-        
-        # Create new session
-        self.client = TelegramClient(
-            session_name,
-            self.api_id,
-            self.api_hash,
-            device_model="Desktop",
-            system_version="Windows",
-            app_version="1.0",
-            retry_delay=1
+        from forwarder_engine import ChatLoader
+        self.loader = ChatLoader(
+            client_manager, api_id, api_hash, phone, load_chats=load_chats,
+            on_chats=self.update_signal.emit,
+            on_chat_page=self.page_signal.emit,
+            on_error=self.error_signal.emit,
+            on_code_request=self.code_request_signal.emit,
+            on_login_success=self.login_success_signal.emit,
+            on_status=self.status_signal.emit,
+            on_progress=self.progress_signal.emit
         )
-        await self.client.connect()
-        return await self.client.is_user_authorized()
 
-    async def get_chats(self):
-        try:
-            # Initialize client
-            self.status_signal.emit("Connecting to Telegram...")
-            self.progress_signal.emit("Step 1/3: Initializing connection...")
-            
-            is_authorized = await self.initialize_client()
-            
-            if not is_authorized:
-                self.status_signal.emit("Requesting verification code...")
-                self.progress_signal.emit("Step 2/3: Verification...")
-                
-                await self.client.send_code_request(self.phone)
-                self.code_request_signal.emit()
-                
-                try:
-                    await asyncio.wait_for(self.code_ready.wait(), timeout=self.verification_timeout)
-                except asyncio.TimeoutError:
-                    raise Exception("Verification timeout")
-                
-                if not self.code:
-                    raise Exception("Verification cancelled")
-                
-                try:
-                    self.status_signal.emit("Signing in...")
-                    self.progress_signal.emit("Step 3/3: Authentication...")
-                    await self.client.sign_in(self.phone, self.code)
-                    self.login_success_signal.emit()
-                except Exception as e:
-                    raise Exception(f"Login failed: {str(e)}")
-            else:
-                self.status_signal.emit("Already authorized!")
-                self.login_success_signal.emit()
-
-            # Only load chats if specifically requested
-            if self.load_chats:
-                await self.load_chat_list()
-            else:
-                # Just disconnect if we're only doing login
-                if self.client:
-                    await self.client.disconnect()
-
-        except Exception as e:
-            self.error_signal.emit(str(e))
-            if self.client:
-                await self.client.disconnect()
-
-    async def load_chat_list(self):
-        """Separate method for loading chats"""
-        try:
-            self.status_signal.emit("Loading chats...")
-            self.progress_signal.emit("Loading chat list...")
-            
-            dialogs = await self.client.get_dialogs()
-            chat_list = []
-            
-            for dialog in dialogs:
-                chat_type = "Unknown"
-                chat_title = getattr(dialog.entity, 'title', None) or getattr(dialog.entity, 'first_name', 'Unknown')
-                
-                if isinstance(dialog.entity, types.User):
-                    chat_type = "Private"
-                elif isinstance(dialog.entity, (types.Chat, types.ChatForbidden)):
-                    chat_type = "Group"
-                elif isinstance(dialog.entity, types.Channel):
-                    chat_type = "Channel"
-
-                chat_info = {
-                    'id': dialog.id,
-                    'title': chat_title,
-                    'type': chat_type,
-                    'unread_count': dialog.unread_count
-                }
-                chat_list.append(chat_info)
-                
-            self.update_signal.emit(chat_list)
-            self.status_signal.emit("Chats loaded successfully!")
-            
-        except Exception as e:
-            self.error_signal.emit(f"Error loading chats: {str(e)}")
-        finally:
-            if self.client:
-                await self.client.disconnect()
+    def set_verification_code(self, code):
+        self.loader.set_verification_code(code)
 
     def run(self):
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.get_chats())
+            self.loader.client_manager.run(self.loader.get_chats())
         except Exception as e:
             self.error_signal.emit(f"Runtime error: {str(e)}")
-        finally:
-            loop.close()
 
-class ForwarderThread(QThread):
+class ForwarderJob(QObject):
+    """A ForwardingJob whose callbacks, called on the client loop, reach the UI as signals"""
     message_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
-    progress_signal = pyqtSignal(int)
-    reconnect_signal = pyqtSignal()
+    # A MetricsSnapshot, emitted at a fixed interval rather than per message
+    metrics_signal = pyqtSignal(object)
 
-    def __init__(self, api_id, api_hash, phone, source_id, dest_id, filters, forward_existing=True):
+    def __init__(self, name, client_manager, api_id, api_hash, phone, source_id, dest_ids, filters,
+                 forward_existing=True, copy_mode='copy', live=False, dedup=True, min_id=0, max_id=0,
+                 incremental=False, send_accounts=(), trace_file=None):
         super().__init__()
-        self.api_id = api_id
-        self.api_hash = api_hash
-        self.phone = phone
-        self.source_id = source_id
-        self.dest_id = dest_id
-        self.filters = filters
-        self.is_running = True
-        self.client = None
-        self.retry_count = 0
-        self.max_retries = 5
-        self.reconnect_interval = 5
-        self.forward_existing = forward_existing
-        self.messages_processed = 0
-
-    async def connect_client(self):
-        try:
-            if self.client and self.client.is_connected():
-                return True
-
-            self.client = TelegramClient(
-                f'session_{self.phone}',
-                self.api_id,
-                self.api_hash,
-                device_model="Desktop",
-                system_version="Windows",
-                app_version="1.0",
-                retry_delay=1
-            )
-            await self.client.connect()
-            
-            if not await self.client.is_user_authorized():
-                self.error_signal.emit("Please login first!")
-                return False
-
-            return True
-        except Exception as e:
-            self.error_signal.emit(f"Connection error: {str(e)}")
-            return False
-
-    async def forward_existing_messages(self):
-        try:
-            self.message_signal.emit("📥 Starting to copy messages...")
-            
-            # Get messages from source chat
-            messages = []
-            async for message in self.client.iter_messages(self.source_id, limit=None):
-                if not self.is_running:
-                    break
-                    
-                should_forward = False
-                message_type = "Unknown"
-                
-                if message.text and self.filters['text']:
-                    should_forward = True
-                    message_type = "Text"
-                elif message.media:
-                    if hasattr(message.media, 'photo') and self.filters['media']:
-                        should_forward = True
-                        message_type = "Photo"
-                    elif hasattr(message.media, 'document'):
-                        if self.filters['media'] and getattr(message.media.document, 'mime_type', '').startswith('video/'):
-                            should_forward = True
-                            message_type = "Video"
-                        elif self.filters['documents']:
-                            should_forward = True
-                            message_type = "Document"
-                
-                if should_forward:
-                    messages.append((message, message_type))
-            
-            total_messages = len(messages)
-            self.message_signal.emit(f"Found {total_messages} messages to copy...")
-            
-            # Copy messages in reverse order to maintain chronological order
-            for i, (message, message_type) in enumerate(reversed(messages)):
-                if not self.is_running:
-                    break
-                    
-                try:
-                    if message.text:
-                        await self.client.send_message(self.dest_id, message.text)
-                    if message.media:
-                        await self.client.send_file(self.dest_id, message.media)
-                    
-                    self.messages_processed += 1
-                    progress = int((self.messages_processed / total_messages) * 100)
-                    self.progress_signal.emit(progress)
-                    self.message_signal.emit(f"✅ Copied {message_type} message ({self.messages_processed}/{total_messages})")
-                except Exception as send_error:
-                    self.error_signal.emit(f"Error copying message: {str(send_error)}")
-                
-                # Add a small delay to avoid flooding
-                await asyncio.sleep(0.5)
-            
-            self.message_signal.emit("✨ Finished copying messages!")
-            
-        except Exception as e:
-            self.error_signal.emit(f"Error copying messages: {str(e)}")
-
-    async def forward_messages(self):
-        while self.is_running:
-            try:
-                if not await self.connect_client():
-                    if self.retry_count >= self.max_retries:
-                        self.error_signal.emit("Max reconnection attempts reached. Please restart the application.")
-                        break
-                    self.retry_count += 1
-                    self.message_signal.emit(f"Reconnecting... Attempt {self.retry_count}/{self.max_retries}")
-                    await asyncio.sleep(self.reconnect_interval)
-                    continue
-
-                self.retry_count = 0
-
-                try:
-                    source_entity = await self.client.get_entity(self.source_id)
-                    dest_entity = await self.client.get_entity(self.dest_id)
-                    
-                    source_name = getattr(source_entity, 'title', None) or getattr(source_entity, 'first_name', 'Unknown') or str(self.source_id)
-                    dest_name = getattr(dest_entity, 'title', None) or getattr(dest_entity, 'first_name', 'Unknown') or str(self.dest_id)
-                    
-                    self.message_signal.emit(f"Connected to source: {source_name}")
-                    self.message_signal.emit(f"Connected to destination: {dest_name}")
-
-                    if self.forward_existing:
-                        await self.forward_existing_messages()
-                        self.is_running = False
-                        break
-
-                except Exception as e:
-                    self.error_signal.emit(f"Error validating chat IDs: {str(e)}")
-                    continue
-
-            except ConnectionError:
-                if self.is_running:
-                    self.message_signal.emit("📡 Connection lost. Attempting to reconnect...")
-                    continue
-            except Exception as e:
-                self.error_signal.emit(f"Error in forward_messages: {str(e)}")
-                if self.is_running:
-                    await asyncio.sleep(self.reconnect_interval)
-                    continue
-
-        if self.client:
-            await self.client.disconnect()
-
-    def run(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.forward_messages())
+        from forwarder_engine import ForwardingJob
+        self.name = name
+        # Set once the scheduler has started the job
+        self.job_id = None
+        self.job = ForwardingJob(
+            client_manager, api_id, api_hash, phone, source_id, dest_ids, filters,
+            forward_existing=forward_existing, copy_mode=copy_mode, live=live, dedup=dedup,
+            min_id=min_id, max_id=max_id, incremental=incremental, send_accounts=send_accounts,
+            trace_file=trace_file,
+            on_message=self.message_signal.emit,
+            on_error=self.error_signal.emit,
+            on_metrics=self.metrics_signal.emit
+        )
 
-    def stop(self):
-        self.is_running = False
+    @property
+    def mode(self):
+        if self.job.forward_existing and self.job.live:
+            return "History + live"
+        return "Live" if self.job.live else "History"
 
 class LoginDialog(QDialog):
     def __init__(self, parent=None):
@@ -562,99 +560,149 @@ class LoginDialog(QDialog):
             'phone': self.phone_input.text().strip()
         }
 
+class FilterRulesDialog(QDialog):
+    """Edit the extra filter rules as JSON, or load/save them from a file"""
+
+    def __init__(self, rules, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Filter Rules')
+        self.setModal(True)
+        self.rules = rules
+        self.setup_ui()
+        self.resize(520, 420)
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        info_text = QLabel(
+            "Rules as JSON, all must match. For example:\n"
+            '{"keywords": ["release"], "exclude_keywords": ["#ad"], "mime": ["video/*"],\n'
+            ' "min_size": 1048576, "after": "2024-01-01", "min_views": 100, "has_link": false}\n'
+            '"types" (text, photo, video, document) overrides the checkboxes.'
+        )
+        info_text.setStyleSheet("QLabel { color: gray; }")
+        layout.addWidget(info_text)
+
+        self.rules_edit = QPlainTextEdit()
+        self.rules_edit.setPlainText(json.dumps(self.rules, indent=2, ensure_ascii=False) if self.rules else '')
+        layout.addWidget(self.rules_edit)
+
+        button_box = QHBoxLayout()
+        self.load_button = QPushButton('📂 Load File')
+        self.load_button.clicked.connect(self.load_file)
+        self.save_button = QPushButton('💾 Save File')
+        self.save_button.clicked.connect(self.save_file)
+        self.ok_button = QPushButton('OK')
+        self.ok_button.clicked.connect(self.accept)
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.reject)
+
+        button_box.addWidget(self.load_button)
+        button_box.addWidget(self.save_button)
+        button_box.addStretch()
+        button_box.addWidget(self.ok_button)
+        button_box.addWidget(self.cancel_button)
+        layout.addLayout(button_box)
+
+        self.setLayout(layout)
+
+    def parse_rules(self):
+        """The edited rules, checked by compiling them; raises ValueError if invalid"""
+        text = self.rules_edit.toPlainText().strip()
+        rules = json.loads(text) if text else {}
+        if not isinstance(rules, dict):
+            raise ValueError("Rules must be a JSON object")
+        from forwarder_filters import MessageFilter
+        MessageFilter(rules)
+        return rules
+
+    def load_file(self):
+        filename, _ = QFileDialog.getOpenFileName(self, 'Load Filter Rules', '', 'JSON files (*.json)')
+        if not filename:
+            return
+        try:
+            from forwarder_filters import load_rules
+            self.rules_edit.setPlainText(json.dumps(load_rules(filename), indent=2, ensure_ascii=False))
+        except Exception as e:
+            QMessageBox.warning(self, 'Error', f'Could not load rules: {str(e)}')
+
+    def save_file(self):
+        try:
+            rules = self.parse_rules()
+        except ValueError as e:
+            QMessageBox.warning(self, 'Invalid Rules', str(e))
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, 'Save Filter Rules', 'filter_rules.json', 'JSON files (*.json)')
+        if filename:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(rules, f, indent=2, ensure_ascii=False)
+
+    def accept(self):
+        try:
+            self.rules = self.parse_rules()
+        except ValueError as e:
+            QMessageBox.warning(self, 'Invalid Rules', str(e))
+            return
+        super().accept()
+
 class TelegramForwarderUI(QMainWindow):
+    # A job ended, emitted from the client loop thread
+    job_finished_signal = pyqtSignal(int)
+    # The client loop is up and saved credentials are being used, see finish_startup
+    ready_signal = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.api_id = None
         self.api_hash = None
         self.phone = None
         self.chat_list = []
-        self.original_chat_list = []
-        self.filtered_source_chats = []
-        self.filtered_dest_chats = []
+        # Both chat pickers are filtered views of one model
+        self.chat_model = ChatListModel(self)
+        self.filter_rules = {}
+        # Extra accounts that share the sending, from accounts.json
+        self.send_accounts = []
+        self.account_threads = {}
+        # Created by finish_startup once the window has been painted
+        self.client_manager = None
+        self.scheduler = None
+        self.started = False
+        self.job_finished_signal.connect(self.job_finished)
+        self.forwarder_jobs = {}
+        self.metrics_server = None
         
         # Initialize UI first
         self.init_ui()
+
+        # In case no paint event arrives, such as when the window starts minimized
+        QTimer.singleShot(1000, self.finish_startup)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.started:
+            # Let the first frame reach the screen before loading Telethon
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Start the client loop, load the send accounts and log in with the saved credentials"""
+        if self.started:
+            return
+        self.started = True
+        from forwarder_engine import ClientManager, JobScheduler, load_accounts
+        self.send_accounts = load_accounts()
+        self.refresh_accounts_list()
+        # One Telegram connection per account, shared by login, chat loading and forwarding
+        self.client_manager = ClientManager()
+        # Forwarding jobs run side by side and share each account's send budget
+        self.scheduler = JobScheduler(self.client_manager, on_finished=self.job_finished_signal.emit)
         
         # Try to load saved credentials and auto-login
         self.load_and_auto_login()
+        self.ready_signal.emit()
 
     def init_ui(self):
         self.setWindowTitle('Telegram Media Forwarder Pro')
         self.setGeometry(100, 100, 800, 600)
-        self.setStyleSheet("""
-            * {
-                font-family: 'Segoe UI', Arial, sans-serif;
-            }
-            QMainWindow {
-                background-color: #ffffff;
-            }
-            QLabel {
-                color: #2c3e50;
-                font-size: 12px;
-                font-weight: bold;
-            }
-            QPushButton {
-                background-color: #3498db;
-                color: white;
-                border: none;
-                padding: 10px;
-                border-radius: 5px;
-                font-weight: bold;
-                min-height: 35px;
-            }
-            QPushButton:hover {
-                background-color: #2980b9;
-            }
-            QPushButton:disabled {
-                background-color: #bdc3c7;
-            }
-            QLineEdit, QComboBox {
-                padding: 8px;
-                border: 2px solid #bdc3c7;
-                border-radius: 5px;
-                min-height: 30px;
-            }
-            QLineEdit:focus, QComboBox:focus {
-                border: 2px solid #3498db;
-            }
-            QTextEdit {
-                border: 2px solid #bdc3c7;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QFrame {
-                border-radius: 5px;
-            }
-            QTabWidget::pane {
-                border: none;
-            }
-            QTabWidget::tab-bar {
-                alignment: center;
-            }
-            QTabBar::tab {
-                background-color: #f0f0f0;
-                color: #2c3e50;
-                padding: 10px 20px;
-                border-top-left-radius: 5px;
-                border-top-right-radius: 5px;
-            }
-            QTabBar::tab:selected {
-                background-color: #3498db;
-                color: white;
-            }
-            QCheckBox {
-                spacing: 10px;
-            }
-            QCheckBox::indicator {
-                width: 18px;
-                height: 18px;
-            }
-            QStatusBar {
-                background-color: #f8f9fa;
-                color: #2c3e50;
-            }
-        """)
 
         # Main widget and layout
         main_widget = QWidget()
@@ -676,29 +724,11 @@ class TelegramForwarderUI(QMainWindow):
 
         # Status indicators with better styling
         self.login_status = QPushButton("⭕ Not Logged In")
-        self.login_status.setStyleSheet("""
-            QPushButton {
-                background-color: #e74c3c;
-                padding: 8px 15px;
-                text-align: left;
-            }
-        """)
+        self.login_status.setStyleSheet(STATUS_STYLES[False])
         self.chat_status = QPushButton("⭕ Chats Not Loaded")
-        self.chat_status.setStyleSheet("""
-            QPushButton {
-                background-color: #e74c3c;
-                padding: 8px 15px;
-                text-align: left;
-            }
-        """)
+        self.chat_status.setStyleSheet(STATUS_STYLES[False])
         self.forward_status = QPushButton("⭕ Forwarding Inactive")
-        self.forward_status.setStyleSheet("""
-            QPushButton {
-                background-color: #e74c3c;
-                padding: 8px 15px;
-                text-align: left;
-            }
-        """)
+        self.forward_status.setStyleSheet(STATUS_STYLES[False])
 
         status_layout.addWidget(self.login_status)
         status_layout.addWidget(self.chat_status)
@@ -754,12 +784,85 @@ class TelegramForwarderUI(QMainWindow):
         
         login_group.setLayout(login_form)
         login_layout.addWidget(login_group)
+
+        # Extra send accounts
+        accounts_group = QFrame()
+        accounts_group.setStyleSheet("QFrame { background-color: #f8f9fa; padding: 15px; margin-top: 10px; }")
+        accounts_layout = QVBoxLayout()
+        accounts_layout.addWidget(QLabel('Send Accounts:'))
+        accounts_info = QLabel("Extra accounts share the sending to get past one account's flood limits.\n"
+                               "They must be members of the source and destination chats.")
+        accounts_info.setStyleSheet("QLabel { color: gray; font-weight: normal; }")
+        accounts_layout.addWidget(accounts_info)
+        self.accounts_list = QListWidget()
+        self.accounts_list.setMaximumHeight(100)
+        accounts_layout.addWidget(self.accounts_list)
+        accounts_buttons = QHBoxLayout()
+        self.add_account_btn = QPushButton('➕ Add Account')
+        self.add_account_btn.clicked.connect(self.add_send_account)
+        self.remove_account_btn = QPushButton('➖ Remove')
+        self.remove_account_btn.clicked.connect(self.remove_send_account)
+        accounts_buttons.addWidget(self.add_account_btn)
+        accounts_buttons.addWidget(self.remove_account_btn)
+        accounts_layout.addLayout(accounts_buttons)
+        accounts_group.setLayout(accounts_layout)
+        login_layout.addWidget(accounts_group)
+        self.refresh_accounts_list()
+
         login_tab.setLayout(login_layout)
         
         tabs.addTab(login_tab, "Login")
 
-        # Setup tab
-        setup_tab = QWidget()
+        # Setup tab, built the first time it is shown
+        self.tabs = tabs
+        self.setup_tab = QWidget()
+        self.setup_tab_built = False
+        tabs.addTab(self.setup_tab, "Setup")
+        tabs.currentChanged.connect(self.on_tab_changed)
+
+        # Logs tab
+        logs_tab = QWidget()
+        logs_layout = QVBoxLayout()
+        
+        self.log_display = LogView()
+        logs_layout.addWidget(QLabel('Activity Logs:'))
+        logs_layout.addWidget(self.log_display)
+        
+        logs_tab.setLayout(logs_layout)
+        tabs.addTab(logs_tab, "Logs")
+
+        layout.addWidget(tabs)
+
+        # Watermark
+        watermark = QLabel('Made by azhardotcoder')
+        watermark.setStyleSheet('color: #95a5a6; font-size: 10px; padding: 5px;')
+        watermark.setAlignment(Qt.AlignRight)
+        layout.addWidget(watermark)
+
+        # Create menu bar
+        menubar = self.menuBar()
+        account_menu = menubar.addMenu('Account')
+        
+        # Add login/logout actions
+        self.login_action = QAction('Login', self)
+        self.login_action.triggered.connect(self.show_login_dialog)
+        account_menu.addAction(self.login_action)
+        
+        self.logout_action = QAction('Logout', self)
+        self.logout_action.triggered.connect(self.logout)
+        account_menu.addAction(self.logout_action)
+
+        self.show()
+
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.setup_tab:
+            self.build_setup_tab()
+
+    def build_setup_tab(self):
+        """Create the Setup tab's widgets, once; anything touching them before the tab is shown calls this"""
+        if self.setup_tab_built:
+            return
+        self.setup_tab_built = True
         setup_layout = QVBoxLayout()
         
         # Phone number section
@@ -810,7 +913,14 @@ class TelegramForwarderUI(QMainWindow):
         source_filter_layout.addWidget(self.source_channel_radio)
         source_layout.addLayout(source_filter_layout)
         
+        self.source_search = self.create_chat_search(self.filter_source_by_text)
+        source_layout.addWidget(self.source_search)
+
+        self.source_proxy = ChatFilterProxy(self)
+        self.source_proxy.setSourceModel(self.chat_model)
         self.source_combo = QComboBox()
+        self.source_combo.setModel(self.source_proxy)
+        self.source_combo.view().setUniformItemSizes(True)
         self.source_combo.setPlaceholderText('Select source chat')
         source_layout.addWidget(self.source_combo)
         chat_layout.addLayout(source_layout)
@@ -843,9 +953,30 @@ class TelegramForwarderUI(QMainWindow):
         dest_filter_layout.addWidget(self.dest_channel_radio)
         dest_layout.addLayout(dest_filter_layout)
         
+        self.dest_search = self.create_chat_search(self.filter_dest_by_text)
+        dest_layout.addWidget(self.dest_search)
+
+        self.dest_proxy = ChatFilterProxy(self)
+        self.dest_proxy.setSourceModel(self.chat_model)
         self.dest_combo = QComboBox()
+        self.dest_combo.setModel(self.dest_proxy)
+        self.dest_combo.view().setUniformItemSizes(True)
         self.dest_combo.setPlaceholderText('Select destination chat')
         dest_layout.addWidget(self.dest_combo)
+
+        # Several destinations are fed from a single read of the source
+        dest_buttons_layout = QHBoxLayout()
+        self.add_dest_btn = QPushButton('➕ Add Destination')
+        self.add_dest_btn.clicked.connect(self.add_destination)
+        self.remove_dest_btn = QPushButton('➖ Remove')
+        self.remove_dest_btn.clicked.connect(self.remove_destination)
+        dest_buttons_layout.addWidget(self.add_dest_btn)
+        dest_buttons_layout.addWidget(self.remove_dest_btn)
+        dest_layout.addLayout(dest_buttons_layout)
+
+        self.dest_list = QListWidget()
+        self.dest_list.setMaximumHeight(100)
+        dest_layout.addWidget(self.dest_list)
         chat_layout.addLayout(dest_layout)
 
         chat_group.setLayout(chat_layout)
@@ -867,6 +998,79 @@ class TelegramForwarderUI(QMainWindow):
         filter_layout.addWidget(self.text_check)
         filter_layout.addWidget(self.media_check)
         filter_layout.addWidget(self.docs_check)
+
+        # Keyword, regex, mime, size, date, sender, views and link rules
+        rules_layout = QHBoxLayout()
+        self.rules_btn = QPushButton('⚙️ Filter Rules...')
+        self.rules_btn.clicked.connect(self.edit_filter_rules)
+        self.rules_label = QLabel('No extra rules')
+        self.rules_label.setStyleSheet("color: #7f8c8d;")
+        rules_layout.addWidget(self.rules_btn)
+        rules_layout.addWidget(self.rules_label)
+        rules_layout.addStretch()
+        filter_layout.addLayout(rules_layout)
+
+        self.copy_check = QCheckBox('Hide original sender (copy instead of forward)')
+        self.copy_check.setChecked(True)
+        filter_layout.addWidget(self.copy_check)
+
+        history_layout = QHBoxLayout()
+        self.history_check = QCheckBox('Copy existing messages')
+        self.history_check.setChecked(True)
+        self.history_mode_combo = QComboBox()
+        self.history_mode_combo.addItems(['Entire history', 'New since last run', 'Range'])
+        self.history_check.toggled.connect(self.history_mode_combo.setEnabled)
+        history_layout.addWidget(self.history_check)
+        history_layout.addWidget(self.history_mode_combo)
+        history_layout.addStretch()
+        filter_layout.addLayout(history_layout)
+
+        # Range mode: optional dates (inclusive) and message IDs (0 = no bound)
+        self.range_widget = QWidget()
+        range_layout = QHBoxLayout(self.range_widget)
+        range_layout.setContentsMargins(20, 0, 0, 0)
+        self.from_date_check = QCheckBox('From')
+        self.from_date_edit = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.to_date_check = QCheckBox('To')
+        self.to_date_edit = QDateEdit(QDate.currentDate())
+        for date_edit in (self.from_date_edit, self.to_date_edit):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat('yyyy-MM-dd')
+        self.from_id_spin = QSpinBox()
+        self.to_id_spin = QSpinBox()
+        for id_spin in (self.from_id_spin, self.to_id_spin):
+            id_spin.setRange(0, 2**31 - 1)
+            id_spin.setSpecialValueText('any')
+        for widget in (self.from_date_check, self.from_date_edit, self.to_date_check, self.to_date_edit,
+                       QLabel('Message #'), self.from_id_spin, QLabel('to #'), self.to_id_spin):
+            range_layout.addWidget(widget)
+        range_layout.addStretch()
+        self.range_widget.setVisible(False)
+        self.history_mode_combo.currentIndexChanged.connect(
+            lambda index: self.range_widget.setVisible(index == 2)
+        )
+        filter_layout.addWidget(self.range_widget)
+
+        self.live_check = QCheckBox('Keep forwarding new messages (live mode)')
+        filter_layout.addWidget(self.live_check)
+
+        self.dedup_check = QCheckBox('Skip files and texts already sent to the destination')
+        self.dedup_check.setChecked(True)
+        filter_layout.addWidget(self.dedup_check)
+
+        self.trace_check = QCheckBox('Record a performance trace (trace_*.json)')
+        filter_layout.addWidget(self.trace_check)
+
+        metrics_layout = QHBoxLayout()
+        self.metrics_check = QCheckBox('Serve Prometheus metrics on localhost port')
+        self.metrics_port_spin = QSpinBox()
+        self.metrics_port_spin.setRange(1024, 65535)
+        self.metrics_port_spin.setValue(9464)
+        self.metrics_check.toggled.connect(self.toggle_metrics_server)
+        metrics_layout.addWidget(self.metrics_check)
+        metrics_layout.addWidget(self.metrics_port_spin)
+        metrics_layout.addStretch()
+        filter_layout.addLayout(metrics_layout)
         
         filter_group.setLayout(filter_layout)
         setup_layout.addWidget(filter_group)
@@ -892,163 +1096,106 @@ class TelegramForwarderUI(QMainWindow):
         
         setup_layout.addLayout(button_layout)
 
+        # Running jobs; live ones get a larger share of the account's sends than history copies
+        self.jobs_table = QTableWidget(0, 5)
+        self.jobs_table.setHorizontalHeaderLabels(['Job', 'Mode', 'State', 'Progress', 'Status'])
+        self.jobs_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)
+        self.jobs_table.verticalHeader().setVisible(False)
+        self.jobs_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.jobs_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.jobs_table.setMaximumHeight(150)
+        self.jobs_table.setVisible(False)
+        setup_layout.addWidget(self.jobs_table)
+
+        job_buttons = QHBoxLayout()
+        self.pause_job_btn = QPushButton('⏸ Pause')
+        self.pause_job_btn.clicked.connect(lambda: self.control_selected_jobs(self.scheduler.pause))
+        self.resume_job_btn = QPushButton('▶ Resume')
+        self.resume_job_btn.clicked.connect(lambda: self.control_selected_jobs(self.scheduler.resume))
+        self.cancel_job_btn = QPushButton('✖ Cancel')
+        self.cancel_job_btn.clicked.connect(lambda: self.control_selected_jobs(self.scheduler.cancel))
+        self.job_buttons = QWidget()
+        for button in (self.pause_job_btn, self.resume_job_btn, self.cancel_job_btn):
+            job_buttons.addWidget(button)
+        job_buttons.addStretch()
+        job_buttons.setContentsMargins(0, 0, 0, 0)
+        self.job_buttons.setLayout(job_buttons)
+        self.job_buttons.setVisible(False)
+        setup_layout.addWidget(self.job_buttons)
+
         # Export button
         self.export_btn = QPushButton('📥 Export Chat List')
         self.export_btn.clicked.connect(self.export_chats)
         self.export_btn.setEnabled(False)
         setup_layout.addWidget(self.export_btn)
 
-        setup_tab.setLayout(setup_layout)
-        tabs.addTab(setup_tab, "Setup")
-
-        # Logs tab
-        logs_tab = QWidget()
-        logs_layout = QVBoxLayout()
-        
-        self.log_display = QTextEdit()
-        self.log_display.setReadOnly(True)
-        logs_layout.addWidget(QLabel('Activity Logs:'))
-        logs_layout.addWidget(self.log_display)
-        
-        logs_tab.setLayout(logs_layout)
-        tabs.addTab(logs_tab, "Logs")
-
-        layout.addWidget(tabs)
-
-        # Watermark
-        watermark = QLabel('Made by azhardotcoder')
-        watermark.setStyleSheet('color: #95a5a6; font-size: 10px; padding: 5px;')
-        watermark.setAlignment(Qt.AlignRight)
-        layout.addWidget(watermark)
-
-        # Create menu bar
-        menubar = self.menuBar()
-        account_menu = menubar.addMenu('Account')
-        
-        # Add login/logout actions
-        self.login_action = QAction('Login', self)
-        self.login_action.triggered.connect(self.show_login_dialog)
-        account_menu.addAction(self.login_action)
-        
-        self.logout_action = QAction('Logout', self)
-        self.logout_action.triggered.connect(self.logout)
-        account_menu.addAction(self.logout_action)
-
-        self.show()
-
-    def populate_combo_boxes(self, source_filter="", dest_filter=""):
-        # Store current text to restore after clearing
-        source_text = self.source_combo.currentText() if self.source_combo.lineEdit() else ""
-        dest_text = self.dest_combo.currentText() if self.dest_combo.lineEdit() else ""
-        
-        # Clear existing items
-        self.source_combo.clear()
-        self.dest_combo.clear()
-        
-        # Filter and populate source chats
-        self.filtered_source_chats = []
-        for chat in self.original_chat_list:
-            if source_filter.lower() in chat['title'].lower():
-                display_text = f"{chat['title']} ({chat['type']}) [ID: {chat['id']}]"
-                self.source_combo.addItem(display_text, chat['id'])
-                self.filtered_source_chats.append(chat)
-        
-        # Filter and populate destination chats
-        self.filtered_dest_chats = []
-        for chat in self.original_chat_list:
-            if dest_filter.lower() in chat['title'].lower():
-                display_text = f"{chat['title']} ({chat['type']}) [ID: {chat['id']}]"
-                self.dest_combo.addItem(display_text, chat['id'])
-                self.filtered_dest_chats.append(chat)
-        
-        # Restore the search text
-        if source_filter:
-            self.source_combo.setEditText(source_text)
-        if dest_filter:
-            self.dest_combo.setEditText(dest_text)
+        self.setup_tab.setLayout(setup_layout)
+
+    def create_chat_search(self, on_search):
+        """Search box that applies its text once typing pauses for 200 ms"""
+        search = QLineEdit()
+        search.setPlaceholderText('🔍 Search by title or ID')
+        search.setClearButtonEnabled(True)
+        timer = QTimer(search)
+        timer.setSingleShot(True)
+        timer.setInterval(200)
+        timer.timeout.connect(lambda: on_search(search.text()))
+        search.textChanged.connect(timer.start)
+        return search
+
+    def checked_category(self, private_radio, group_radio, channel_radio):
+        if private_radio.isChecked():
+            return "Private"
+        if group_radio.isChecked():
+            return "Group"
+        if channel_radio.isChecked():
+            return "Channel"
+        return None
 
     def filter_source_by_category(self):
-        self.source_combo.clear()
-        category = None
-        
-        if self.source_private_radio.isChecked():
-            category = "Private"
-        elif self.source_group_radio.isChecked():
-            category = "Group"
-        elif self.source_channel_radio.isChecked():
-            category = "Channel"
-            
-        for chat in self.original_chat_list:
-            if category is None or chat['type'] == category:
-                display_text = f"{chat['title']} ({chat['type']})"
-                # Add emoji based on chat type
-                if chat['type'] == "Private":
-                    display_text = f"👤 {display_text}"
-                elif chat['type'] == "Group":
-                    display_text = f"👥 {display_text}"
-                elif chat['type'] == "Channel":
-                    display_text = f"📢 {display_text}"
-                self.source_combo.addItem(display_text, chat['id'])
+        self.source_proxy.set_category(self.checked_category(
+            self.source_private_radio, self.source_group_radio, self.source_channel_radio
+        ))
 
     def filter_dest_by_category(self):
-        self.dest_combo.clear()
-        category = None
-        
-        if self.dest_private_radio.isChecked():
-            category = "Private"
-        elif self.dest_group_radio.isChecked():
-            category = "Group"
-        elif self.dest_channel_radio.isChecked():
-            category = "Channel"
-            
-        for chat in self.original_chat_list:
-            if category is None or chat['type'] == category:
-                display_text = f"{chat['title']} ({chat['type']})"
-                # Add emoji based on chat type
-                if chat['type'] == "Private":
-                    display_text = f"👤 {display_text}"
-                elif chat['type'] == "Group":
-                    display_text = f"👥 {display_text}"
-                elif chat['type'] == "Channel":
-                    display_text = f"📢 {display_text}"
-                self.dest_combo.addItem(display_text, chat['id'])
+        self.dest_proxy.set_category(self.checked_category(
+            self.dest_private_radio, self.dest_group_radio, self.dest_channel_radio
+        ))
+
+    def select_chat(self, combo, chat_id):
+        """Reselect a chat after the list was reloaded, if it is still shown"""
+        row = self.chat_model.rows_by_id.get(chat_id)
+        if row is None:
+            return
+        index = combo.model().mapFromSource(self.chat_model.index(row))
+        if index.isValid():
+            combo.setCurrentIndex(index.row())
+
+    def filter_source_by_text(self, text):
+        self.source_proxy.set_text(text)
+
+    def filter_dest_by_text(self, text):
+        self.dest_proxy.set_text(text)
 
     def update_status(self, status, is_active=True):
         if status == 'login':
             self.login_status.setText("✅ Logged In" if is_active else "⭕ Not Logged In")
-            self.login_status.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {'#2ecc71' if is_active else '#e74c3c'};
-                    padding: 8px 15px;
-                    text-align: left;
-                }}
-            """)
+            self.login_status.setStyleSheet(STATUS_STYLES[is_active])
         elif status == 'chats':
             self.chat_status.setText("✅ Chats Loaded" if is_active else "⭕ Chats Not Loaded")
-            self.chat_status.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {'#2ecc71' if is_active else '#e74c3c'};
-                    padding: 8px 15px;
-                    text-align: left;
-                }}
-            """)
+            self.chat_status.setStyleSheet(STATUS_STYLES[is_active])
         elif status == 'forward':
             self.forward_status.setText("✅ Forwarding Active" if is_active else "⭕ Forwarding Inactive")
-            self.forward_status.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {'#2ecc71' if is_active else '#e74c3c'};
-                    padding: 8px 15px;
-                    text-align: left;
-                }}
-            """)
+            self.forward_status.setStyleSheet(STATUS_STYLES[is_active])
 
     def update_chat_list(self, chats):
+        self.build_setup_tab()
         self.chat_list = chats
-        self.original_chat_list = chats.copy()
-        
-        # Initial population with all chats
-        self.filter_source_by_category()
-        self.filter_dest_by_category()
+        source_id = self.source_combo.currentData()
+        dest_id = self.dest_combo.currentData()
+        self.chat_model.set_chats(chats)
+        self.select_chat(self.source_combo, source_id)
+        self.select_chat(self.dest_combo, dest_id)
         
         self.start_btn.setEnabled(True)
         self.export_btn.setEnabled(True)
@@ -1056,15 +1203,21 @@ class TelegramForwarderUI(QMainWindow):
         self.log_message("Chat list loaded successfully!")
 
     def logout(self):
+        self.build_setup_tab()
         try:
             # Remove saved credentials
             if os.path.exists('credentials.json'):
                 os.remove('credentials.json')
             
+            # Close the account's connection before removing its session file
+            self.client_manager.run(self.client_manager.disconnect(self.phone))
+
             # Remove session file
             session_file = f'session_{self.phone}.session'
             if os.path.exists(session_file):
                 os.remove(session_file)
+            from forwarder_engine import ChatCache
+            ChatCache(self.phone).clear()
             
             # Clear UI fields
             self.api_id_input.clear()
@@ -1130,7 +1283,8 @@ class TelegramForwarderUI(QMainWindow):
         
         try:
             # Initialize thread for login only (don't load chats)
-            self.auth_thread = ChatListThread(self.api_id, self.api_hash, self.phone, load_chats=False)
+            self.auth_thread = ChatListThread(self.client_manager, self.api_id, self.api_hash, self.phone,
+                                              load_chats=False)
             self.auth_thread.update_signal.connect(self.update_chat_list)
             self.auth_thread.error_signal.connect(self.handle_auth_error)
             self.auth_thread.code_request_signal.connect(self.show_otp_dialog)
@@ -1148,6 +1302,8 @@ class TelegramForwarderUI(QMainWindow):
 
     def handle_login_success(self):
         """Handle successful login and save credentials"""
+        from forwarder_engine import ChatCache
+        self.build_setup_tab()
         self.update_status('login', True)
         self.log_message("Successfully logged in!")
         self.load_chats_btn.setEnabled(True)
@@ -1155,11 +1311,17 @@ class TelegramForwarderUI(QMainWindow):
         # Save credentials after successful login
         self.save_credentials()
 
+        # The cached chat list shows up at once, then only changed chats are fetched
+        if os.path.exists(ChatCache.path_for(self.phone)):
+            self.load_chats()
+
     def load_chats(self):
         self.log_message("Loading chats...")
         # Create new thread specifically for loading chats
-        self.chat_list_thread = ChatListThread(self.api_id, self.api_hash, self.phone, load_chats=True)
+        self.chat_list_thread = ChatListThread(self.client_manager, self.api_id, self.api_hash, self.phone,
+                                              load_chats=True)
         self.chat_list_thread.update_signal.connect(self.update_chat_list)
+        self.chat_list_thread.page_signal.connect(self.chat_model.add_chats)
         self.chat_list_thread.error_signal.connect(self.log_error)
         self.chat_list_thread.status_signal.connect(self.log_message)
         self.chat_list_thread.progress_signal.connect(self.log_message)
@@ -1173,50 +1335,200 @@ class TelegramForwarderUI(QMainWindow):
                 return
 
             source_id = self.source_combo.currentData()
-            dest_id = self.dest_combo.currentData()
+            if self.dest_list.count() == 0:
+                # A single destination picked in the combo box works as before
+                self.add_destination()
+            dest_ids = self.selected_destinations()
 
-            if not all([source_id, dest_id]):
+            if not source_id or not dest_ids:
                 QMessageBox.warning(self, 'Error', 'Please select source and destination chats!')
                 return
 
             filters = {
+                **self.filter_rules,
                 'text': self.text_check.isChecked(),
                 'media': self.media_check.isChecked(),
                 'documents': self.docs_check.isChecked()
             }
 
-            self.progress_bar.setVisible(True)
+            forward_existing = self.history_check.isChecked()
+            live = self.live_check.isChecked()
+            if not (forward_existing or live):
+                QMessageBox.warning(self, 'Error', 'Please choose existing messages, live mode or both!')
+                return
+
+            history_mode = self.history_mode_combo.currentIndex()
+            min_id = max_id = 0
+            if forward_existing and history_mode == 2:
+                # The range is inclusive in the UI, the engine's bounds are exclusive
+                if self.from_date_check.isChecked():
+                    filters['after'] = self.from_date_edit.date().toString(Qt.ISODate)
+                if self.to_date_check.isChecked():
+                    to_date = self.to_date_edit.date().toPyDate() + timedelta(days=1)
+                    filters['before'] = to_date.isoformat()
+                if self.from_id_spin.value():
+                    min_id = self.from_id_spin.value() - 1
+                if self.to_id_spin.value():
+                    max_id = self.to_id_spin.value() + 1
+                if min_id and max_id and max_id - min_id < 2:
+                    QMessageBox.warning(self, 'Error', 'The message range is empty!')
+                    return
+
+            self.progress_bar.setVisible(forward_existing)
             self.progress_bar.setValue(0)
 
-            self.forwarder_thread = ForwarderThread(
-                self.api_id, 
+            dest_names = [self.dest_list.item(i).data(Qt.UserRole + 1) for i in range(self.dest_list.count())]
+            name = f"{self.source_combo.currentText()} → {', '.join(dest_names)}"
+            forwarder_job = ForwarderJob(
+                name,
+                self.client_manager,
+                self.api_id,
                 self.api_hash,
                 self.phone,
                 source_id,
-                dest_id,
+                dest_ids,
                 filters,
-                forward_existing=True
+                forward_existing=forward_existing,
+                copy_mode='copy' if self.copy_check.isChecked() else 'forward',
+                live=live,
+                dedup=self.dedup_check.isChecked(),
+                min_id=min_id,
+                max_id=max_id,
+                incremental=forward_existing and history_mode == 1,
+                send_accounts=self.send_accounts,
+                trace_file=(f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{source_id}.json"
+                            if self.trace_check.isChecked() else None)
             )
-            self.forwarder_thread.message_signal.connect(self.log_message)
-            self.forwarder_thread.error_signal.connect(self.log_error)
-            self.forwarder_thread.progress_signal.connect(self.update_progress)
-            self.forwarder_thread.start()
-            
-            self.start_btn.setEnabled(False)
+            # Queued signals are delivered after job_id is set below
+            forwarder_job.message_signal.connect(
+                lambda message, job=forwarder_job: self.log_message(f"[#{job.job_id}] {message}"))
+            forwarder_job.error_signal.connect(
+                lambda error, job=forwarder_job: self.log_error(f"[#{job.job_id}] {error}"))
+            forwarder_job.metrics_signal.connect(
+                lambda snapshot, job=forwarder_job: self.update_progress(job.job_id, snapshot))
+            forwarder_job.job_id = self.scheduler.submit(forwarder_job.job)
+            self.forwarder_jobs[forwarder_job.job_id] = forwarder_job
+            self.add_job_row(forwarder_job)
+
             self.stop_btn.setEnabled(True)
             self.update_status('forward', True)
-            self.log_message("Starting to copy messages...")
+            self.log_message(f"Starting job #{forwarder_job.job_id}: {name}")
             
         except Exception as e:
             self.log_error(f"Error starting forwarder: {str(e)}")
 
+    def edit_filter_rules(self):
+        dialog = FilterRulesDialog(self.filter_rules, self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.filter_rules = dialog.rules
+            self.rules_label.setText(', '.join(sorted(self.filter_rules)) if self.filter_rules else 'No extra rules')
+
+    def add_destination(self):
+        dest_id = self.dest_combo.currentData()
+        if not dest_id or dest_id in self.selected_destinations():
+            return
+
+        item = QListWidgetItem(self.dest_combo.currentText())
+        item.setData(Qt.UserRole, dest_id)
+        item.setData(Qt.UserRole + 1, self.dest_combo.currentText())
+        self.dest_list.addItem(item)
+
+    def remove_destination(self):
+        for item in self.dest_list.selectedItems():
+            self.dest_list.takeItem(self.dest_list.row(item))
+
+    def selected_destinations(self):
+        return [self.dest_list.item(i).data(Qt.UserRole) for i in range(self.dest_list.count())]
+
+    def update_route_progress(self, dest_id, value):
+        for i in range(self.dest_list.count()):
+            item = self.dest_list.item(i)
+            if str(item.data(Qt.UserRole)) == dest_id:
+                item.setText(f"{item.data(Qt.UserRole + 1)} — {value}%")
+
     def stop_forwarding(self):
-        if hasattr(self, 'forwarder_thread'):
-            self.forwarder_thread.stop()
-            self.start_btn.setEnabled(True)
+        """Cancel every running job"""
+        for job_id in self.scheduler.running():
+            self.scheduler.cancel(job_id)
+            self.refresh_job_row(job_id)
+        self.stop_btn.setEnabled(False)
+        self.update_status('forward', False)
+        self.log_message("Forwarding stopped.")
+
+    def add_job_row(self, forwarder_job):
+        row = self.jobs_table.rowCount()
+        self.jobs_table.insertRow(row)
+        item = QTableWidgetItem(f"#{forwarder_job.job_id} {forwarder_job.name}")
+        item.setData(Qt.UserRole, forwarder_job.job_id)
+        self.jobs_table.setItem(row, 0, item)
+        self.jobs_table.setItem(row, 1, QTableWidgetItem(forwarder_job.mode))
+        for column in (2, 3, 4):
+            self.jobs_table.setItem(row, column, QTableWidgetItem(''))
+        self.jobs_table.setVisible(True)
+        self.job_buttons.setVisible(True)
+        self.refresh_job_row(forwarder_job.job_id)
+
+    def job_row(self, job_id):
+        for row in range(self.jobs_table.rowCount()):
+            if self.jobs_table.item(row, 0).data(Qt.UserRole) == job_id:
+                return row
+        return None
+
+    def refresh_job_row(self, job_id):
+        row = self.job_row(job_id)
+        if row is not None:
+            self.jobs_table.item(row, 2).setText(self.scheduler.state(job_id).capitalize())
+
+    def selected_jobs(self):
+        rows = {index.row() for index in self.jobs_table.selectionModel().selectedRows()}
+        return [self.jobs_table.item(row, 0).data(Qt.UserRole) for row in sorted(rows)]
+
+    def control_selected_jobs(self, action):
+        """Pause, resume or cancel the jobs selected in the table"""
+        running = self.scheduler.running()
+        for job_id in self.selected_jobs():
+            if job_id in running:
+                action(job_id)
+        # The engine applies pause/resume on the client loop, show it a moment later
+        QTimer.singleShot(100, lambda: [self.refresh_job_row(job_id) for job_id in self.forwarder_jobs])
+
+    def job_finished(self, job_id):
+        self.refresh_job_row(job_id)
+        if not self.scheduler.running():
             self.stop_btn.setEnabled(False)
+            self.progress_bar.setVisible(False)
             self.update_status('forward', False)
-            self.log_message("Forwarding stopped.")
+
+    def toggle_metrics_server(self, enabled):
+        if not enabled:
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+                self.metrics_server = None
+                self.log_message("Metrics endpoint stopped")
+            self.metrics_port_spin.setEnabled(True)
+            return
+        try:
+            from forwarder_metrics import MetricsServer
+            self.metrics_server = MetricsServer(port=self.metrics_port_spin.value())
+            self.metrics_server.add_scheduler(self.scheduler)
+            self.metrics_server.start()
+        except OSError as e:
+            self.metrics_server = None
+            self.log_error(f"Can't serve metrics on port {self.metrics_port_spin.value()}: {str(e)}")
+            self.metrics_check.setChecked(False)
+            return
+        self.metrics_port_spin.setEnabled(False)
+        self.log_message(f"📈 Metrics on http://127.0.0.1:{self.metrics_server.port}/metrics")
+
+    def closeEvent(self, event):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop_all(timeout=5)
+            self.client_manager.shutdown()
+        # Closed before startup finished, don't start it now
+        self.started = True
+        super().closeEvent(event)
 
     def export_chats(self):
         if not self.chat_list:
@@ -1233,19 +1545,34 @@ class TelegramForwarderUI(QMainWindow):
             self.log_error(f"Error exporting chats: {str(e)}")
 
     def log_message(self, message):
-        self.log_display.append(f"[INFO] {message}")
+        self.log_display.append_line(f"[INFO] {message}")
 
     def log_error(self, error):
-        self.log_display.append(f"[ERROR] {error}")
+        self.log_display.append_line(f"[ERROR] {error}")
         self.statusBar().showMessage('Error occurred')
 
-    def update_progress(self, value):
-        self.progress_bar.setValue(value)
-        if value >= 100:
+    def update_progress(self, job_id, snapshot):
+        """Render a job's MetricsSnapshot in its table row, the destination list and the status panel"""
+        from forwarder_engine import format_metrics
+        for dest_id, _, value in snapshot.routes:
+            if value is not None:
+                self.update_route_progress(dest_id, value)
+        row = self.job_row(job_id)
+        if row is not None:
+            if snapshot.progress is not None:
+                self.jobs_table.item(row, 3).setText(f"{snapshot.progress}%")
+            self.jobs_table.item(row, 4).setText(format_metrics(snapshot))
+            self.refresh_job_row(job_id)
+        if job_id != max(self.forwarder_jobs) or job_id not in self.scheduler.running():
+            # The progress bar and status panel follow the newest running job
+            return
+        if snapshot.progress is not None:
+            self.progress_bar.setValue(snapshot.progress)
+        if snapshot.progress == 100:
             self.progress_bar.setVisible(False)
-            self.start_btn.setEnabled(True)
-            self.stop_btn.setEnabled(False)
-            self.update_status('forward', False)
+        running = len(self.scheduler.running())
+        jobs = f" ({running} jobs)" if running > 1 else ''
+        self.forward_status.setText(f"✅ Forwarding Active{jobs} — {format_metrics(snapshot)}")
 
     def show_login_dialog(self):
         dialog = LoginDialog(self)
@@ -1264,7 +1591,8 @@ class TelegramForwarderUI(QMainWindow):
                 QMessageBox.warning(self, 'Error', 'Please fill all fields!')
                 self.show_login_dialog()
 
-    def show_otp_dialog(self):
+    def show_otp_dialog(self, auth_thread=None):
+        auth_thread = auth_thread or self.auth_thread
         self.log_message("Waiting for verification code input...")
         dialog = OTPDialog(self)
         if dialog.exec_() == QDialog.Accepted:
@@ -1273,22 +1601,90 @@ class TelegramForwarderUI(QMainWindow):
                 self.log_message(f"Verification code entered: {code}")
                 # Show loading dialog
                 self.loading_dialog = LoadingDialog("Verifying code...", self)
-                self.auth_thread.status_signal.connect(self.loading_dialog.update_message)
-                self.auth_thread.progress_signal.connect(self.loading_dialog.update_progress)
-                self.auth_thread.login_success_signal.connect(self.loading_dialog.accept)
-                self.auth_thread.error_signal.connect(lambda x: self.loading_dialog.accept())
+                auth_thread.status_signal.connect(self.loading_dialog.update_message)
+                auth_thread.progress_signal.connect(self.loading_dialog.update_progress)
+                auth_thread.login_success_signal.connect(self.loading_dialog.accept)
+                auth_thread.error_signal.connect(lambda x: self.loading_dialog.accept())
                 
-                self.auth_thread.set_verification_code(code)
+                auth_thread.set_verification_code(code)
                 self.loading_dialog.exec_()
             else:
                 self.log_message("No verification code entered")
-                self.auth_thread.set_verification_code(None)
+                auth_thread.set_verification_code(None)
                 self.log_error("Verification cancelled - no code entered")
         else:
             self.log_message("Verification dialog cancelled")
-            self.auth_thread.set_verification_code(None)
+            auth_thread.set_verification_code(None)
             self.log_error("Verification cancelled by user")
 
+    def refresh_accounts_list(self):
+        self.accounts_list.clear()
+        for account in self.send_accounts:
+            item = QListWidgetItem(f"📱 {account['phone']}")
+            item.setData(Qt.UserRole, account['phone'])
+            self.accounts_list.addItem(item)
+
+    def add_send_account(self):
+        """Log in an extra send account through the login and verification code dialogs"""
+        dialog = LoginDialog(self)
+        dialog.setWindowTitle('Add Send Account')
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        credentials = dialog.get_credentials()
+        if not all(credentials.values()):
+            QMessageBox.warning(self, 'Error', 'Please fill all fields!')
+            return
+        if not credentials['phone'].startswith('+'):
+            QMessageBox.warning(self, 'Error', 'Phone number must start with + and country code!')
+            return
+        try:
+            account = {**credentials, 'api_id': int(credentials['api_id'])}
+        except ValueError:
+            QMessageBox.warning(self, 'Error', 'API ID must be a number!')
+            return
+        if account['phone'] == self.phone or any(known['phone'] == account['phone'] for known in self.send_accounts):
+            QMessageBox.warning(self, 'Error', 'This account is already logged in!')
+            return
+
+        self.log_message(f"Logging in send account {account['phone']}...")
+        thread = ChatListThread(self.client_manager, account['api_id'], account['api_hash'], account['phone'],
+                                load_chats=False)
+        thread.error_signal.connect(self.handle_account_error)
+        thread.code_request_signal.connect(lambda: self.show_otp_dialog(thread))
+        thread.login_success_signal.connect(lambda: self.handle_account_login(account))
+        thread.status_signal.connect(self.log_message)
+        self.account_threads[account['phone']] = thread
+        thread.start()
+
+    def handle_account_login(self, account):
+        from forwarder_engine import save_accounts
+        self.send_accounts.append(account)
+        save_accounts(self.send_accounts)
+        self.refresh_accounts_list()
+        self.log_message(f"Send account {account['phone']} logged in")
+
+    def handle_account_error(self, error):
+        self.log_error(error)
+        QMessageBox.warning(self, 'Authentication Error', error)
+
+    def remove_send_account(self):
+        item = self.accounts_list.currentItem()
+        if item is None:
+            return
+        phone = item.data(Qt.UserRole)
+        try:
+            from forwarder_engine import save_accounts
+            self.send_accounts = [account for account in self.send_accounts if account['phone'] != phone]
+            save_accounts(self.send_accounts)
+            self.client_manager.run(self.client_manager.disconnect(phone))
+            session_file = f'session_{phone}.session'
+            if os.path.exists(session_file):
+                os.remove(session_file)
+            self.refresh_accounts_list()
+            self.log_message(f"Send account {phone} removed")
+        except Exception as e:
+            self.log_error(f"Error removing account: {str(e)}")
+
     def load_and_auto_login(self):
         """Load saved credentials and attempt auto-login"""
         try:
@@ -1327,8 +1723,9 @@ class TelegramForwarderUI(QMainWindow):
         except Exception as e:
             self.log_error(f"Error saving credentials: {str(e)}")
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
+def create_app(argv):
+    """The QApplication with the app's font, style and stylesheet"""
+    app = QApplication(argv)
     
     # Set application-wide font
     default_font = QFont('Segoe UI', 9)  # Windows default system font
@@ -1342,35 +1739,10 @@ if __name__ == '__main__':
     # Set style
     app.setStyle(QStyleFactory.create('Fusion'))
     
-    # Set stylesheet
-    app.setStyleSheet("""
-        * {
-            font-family: 'Segoe UI', Arial, sans-serif;
-        }
-        QMainWindow {
-            background-color: #ffffff;
-        }
-        QLabel {
-            color: #2c3e50;
-            font-size: 12px;
-            font-weight: bold;
-        }
-        QPushButton {
-            background-color: #3498db;
-            color: white;
-            border: none;
-            padding: 10px;
-            border-radius: 5px;
-            font-weight: bold;
-            min-height: 35px;
-        }
-        QPushButton:hover {
-            background-color: #2980b9;
-        }
-        QPushButton:disabled {
-            background-color: #bdc3c7;
-        }
-    """)
-    
+    app.setStyleSheet(STYLESHEET)
+    return app
+
+if __name__ == '__main__':
+    app = create_app(sys.argv)
     ex = TelegramForwarderUI()
-    sys.exit(app.exec_()) 
\ No newline at end of file
+    sys.exit(app.exec_())
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import re
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telethon import types
+
+from forwarder_filters import MessageFilter, QueryPlan
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# The shared media tab Telegram lists each fake message under
+TABS = {
+    types.InputMessagesFilterPhotos: {'photo'},
+    types.InputMessagesFilterVideo: {'video'},
+    types.InputMessagesFilterPhotoVideo: {'photo', 'video'},
+    types.InputMessagesFilterGif: {'gif'},
+    types.InputMessagesFilterRoundVideo: {'round'},
+    types.InputMessagesFilterDocument: {'document'},
+    types.InputMessagesFilterMusic: {'music'},
+    types.InputMessagesFilterVoice: {'voice'},
+}
+
+def document(mime_type, size=1000):
+    return types.MessageMediaDocument(document=SimpleNamespace(mime_type=mime_type, size=size, attributes=[]))
+
+def photo(size=1000):
+    return types.MessageMediaPhoto(photo=SimpleNamespace(sizes=[SimpleNamespace(size=size)]))
+
+def message(message_id, text='', media=None, tab=None):
+    return SimpleNamespace(id=message_id, message=text, text=text, media=media, tab=tab, entities=None,
+                           date=START + timedelta(days=message_id), sender_id=1, views=0)
+
+def chat():
+    return [
+        message(1, "plain text"),
+        message(2, "release notes https://example.com"),
+        message(3, "a photo", photo(), 'photo'),
+        message(4, "video release", document('video/mp4'), 'video'),
+        message(5, "video sent as a file", document('video/mp4', 5000), 'document'),
+        message(6, "the report", document('application/pdf'), 'document'),
+        message(7, "", document('video/mp4'), 'gif'),
+        message(8, "", document('video/mp4'), 'round'),
+        message(9, "", document('audio/ogg'), 'voice'),
+        message(10, "", document('audio/mpeg'), 'music'),
+        message(11, "preview https://example.com/page", types.MessageMediaWebPage(webpage=types.WebPageEmpty(id=1))),
+        message(12, "", types.MessageMediaGeo(geo=types.GeoPointEmpty())),
+        message(13, "released a photo", photo(50), 'photo'),
+    ]
+
+class FakeClient:
+    """iter_messages answering type filters from each message's tab, and searches by word prefix"""
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def iter_messages(self, chat, limit=None, reverse=False, min_id=0, max_id=0, offset_date=None,
+                            filter=None, search=None):
+        for item in self.messages:
+            if item.id <= min_id or (max_id and item.id >= max_id):
+                continue
+            if offset_date is not None and item.date < offset_date:
+                continue
+            if filter is types.InputMessagesFilterUrl:
+                if 'https://' not in item.message:
+                    continue
+            elif filter is not None and item.tab not in TABS[filter]:
+                continue
+            words = re.findall(r'\w+', item.message.lower())
+            if search is not None and not any(word.startswith(search) for word in words):
+                continue
+            yield item
+
+def planned(rules, messages):
+    """IDs a history copy picks: the plan's queries, then its residual filter"""
+    plan = QueryPlan(MessageFilter(rules))
+
+    async def collect():
+        return [item async for item in plan.iter_messages(FakeClient(messages), 'chat')]
+
+    return [item.id for item in asyncio.run(collect()) if plan.residual(item)]
+
+class CompileTest(unittest.TestCase):
+    def test_invalid_rules(self):
+        for rules in (
+            {'colour': 'red'},
+            {'types': ['photo', 'sticker']},
+            {'regex': '('},
+            {'min_size': '1MB'},
+            {'max_views': True},
+            {'senders': [True]},
+            {'senders': ['@someone']},
+            {'has_link': 'yes'},
+            {'after': 'yesterday'},
+        ):
+            with self.subTest(rules=rules):
+                with self.assertRaises(ValueError):
+                    MessageFilter(rules)
+
+    def test_blank_keywords_are_dropped(self):
+        message_filter = MessageFilter({'keywords': ['  ', ''], 'exclude_keywords': [' ']})
+        self.assertEqual(message_filter.keywords, [])
+        self.assertEqual(message_filter(message(1, "anything")), "Text")
+
+class ClassifyTest(unittest.TestCase):
+    def test_types(self):
+        message_filter = MessageFilter()
+        names = {item.id: message_filter(item) for item in chat()}
+        self.assertEqual(names[1], "Text")
+        self.assertEqual(names[3], "Photo")
+        self.assertEqual(names[4], "Video")
+        self.assertEqual(names[5], "Video")
+        self.assertEqual(names[6], "Document")
+        self.assertEqual(names[9], "Document")
+        # Media without a file is a text message, and nothing without its text
+        self.assertEqual(names[11], "Text")
+        self.assertIsNone(names[12])
+
+    def test_gui_checkboxes(self):
+        message_filter = MessageFilter({'text': False, 'media': True, 'documents': False})
+        self.assertEqual(message_filter.types, {'photo', 'video'})
+        self.assertIsNone(message_filter(message(1, "plain text")))
+        self.assertIsNone(message_filter(message(6, "the report", document('application/pdf'))))
+
+    def test_mime_and_size(self):
+        message_filter = MessageFilter({'mime': ['video/*'], 'min_size': 2000})
+        self.assertEqual(message_filter(message(5, "", document('video/mp4', 5000))), "Video")
+        self.assertIsNone(message_filter(message(4, "", document('video/mp4', 1000))))
+        self.assertIsNone(message_filter(message(3, "", photo(5000))))
+
+    def test_keywords_match_word_starts(self):
+        message_filter = MessageFilter({'keywords': ['post', 'new release']})
+        self.assertTrue(message_filter(message(1, "Posted today")))
+        self.assertTrue(message_filter(message(1, "the NEW  release")))
+        self.assertIsNone(message_filter(message(1, "a repost")))
+        self.assertIsNone(message_filter(message(1, "new, release")))
+
+class PlanTest(unittest.TestCase):
+    def assertPlanMatchesFilter(self, rules):
+        messages = chat()
+        local = [item.id for item in messages if MessageFilter(rules)(item)]
+        self.assertEqual(planned(rules, messages), local)
+
+    def test_plan_picks_what_the_filter_picks(self):
+        for rules in (
+            {},
+            {'types': ['photo']},
+            {'types': ['video']},
+            {'types': ['document']},
+            {'types': ['photo', 'video']},
+            {'types': ['video', 'document']},
+            {'types': ['text']},
+            {'text': False, 'media': True, 'documents': False},
+            {'types': ['video'], 'keywords': ['video']},
+            {'keywords': ['release'], 'exclude_keywords': ['notes']},
+            {'has_link': True},
+            {'types': ['text'], 'has_link': True},
+            {'before': '2024-01-06'},
+            {'after': '2024-01-05', 'types': ['photo']},
+            {'mime': ['video/*'], 'min_size': 2000},
+        ):
+            with self.subTest(rules=rules):
+                self.assertPlanMatchesFilter(rules)
+
+    def test_video_sent_as_a_file(self):
+        self.assertIn(5, planned({'types': ['video']}, chat()))
+
+if __name__ == '__main__':
+    unittest.main()